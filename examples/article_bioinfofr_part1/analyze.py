@@ -19,6 +19,18 @@ if __name__ == '__main__':
     argparser = argparse.ArgumentParser()
     argparser.add_argument('--json', required=True, type=open)
     argparser.add_argument('--output_dir', required=True)
+    argparser.add_argument('--processes', type=int, default=1,
+                           help='number of processes used to sanitize the data')
+    argparser.add_argument('--no_cache', action='store_true',
+                           help='sanitize the data again and query the geocoder even if they have been cached')
+    argparser.add_argument('--gazetteer',
+                           help='csv list of french communes used to locate unknown cities, instead of GoogleV3')
+    argparser.add_argument('--unknown_is_abroad', action='store_true',
+                           help='with --gazetteer, put the cities missing from it abroad instead of failing')
+    argparser.add_argument('--geocoder_rate', type=float, default=10,
+                           help='maximum number of GoogleV3 queries per second')
+    argparser.add_argument('--geocoder_workers', type=int, default=4,
+                           help='number of threads locating the unknown cities at once')
     args = vars(argparser.parse_args())
     input_file = args['json']
     output_dir = args['output_dir']
@@ -28,9 +40,21 @@ if __name__ == '__main__':
         raise ValueError('output_dir argument ' + str(output_dir)+' is not a directory.')
     output_dir = os.path.abspath(output_dir)
 
+    if args['gazetteer']:
+        geocoder = utils.GazetteerGeocoder(args['gazetteer'], unknown_is_abroad=args['unknown_is_abroad'])
+    else:
+        # the workers share the rate limit of the API
+        geocoder = utils.ThrottledGeocoder(utils.GoogleV3Geocoder(), args['geocoder_rate'])
+    if not args['no_cache']:
+        # remember the results and failures of the geocoder between runs
+        geocoder = utils.CachingGeocoder(geocoder)
+    utils.CityIndex.shared().geocoder = geocoder
+    utils.CityIndex.shared().geocoder_workers = args['geocoder_workers']
+
     print("Loading and sanitizing data...")
     # load the data
-    job_list = utils.load_from_json(input_file)
+    job_list = utils.load_with_cache(input_file.name, use_cache=not args['no_cache'],
+                                     processes=args['processes'])
 
     # run the scripts
     global_lins.run(job_list, output_dir)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+""" Decoder benchmark
+
+Compare the lines/second of the specialised date decoder with bson's json_util object_hook.
+
+"""
+from __future__ import print_function, unicode_literals, division
+
+import argparse
+import json
+import timeit
+
+from bson import json_util
+from sfbistats.utils import decode_json_line
+
+
+def bench(func, lines, repeat):
+    """
+    Returns the best lines/second over repeat runs of func on all the lines.
+    """
+    timer = timeit.Timer(lambda: [func(l) for l in lines])
+    best = min(timer.repeat(repeat=repeat, number=1))
+    return len(lines) / best
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--json', required=True, type=argparse.FileType('r'))
+    argparser.add_argument('--repeat', type=int, default=5)
+    args = vars(argparser.parse_args())
+    lines = args['json'].readlines()
+
+    json_util_speed = bench(lambda l: json.loads(l, object_hook=json_util.object_hook), lines, args['repeat'])
+    decoder_speed = bench(decode_json_line, lines, args['repeat'])
+    print('json_util.object_hook: {:.0f} lines/s'.format(json_util_speed))
+    print('decode_json_line:      {:.0f} lines/s'.format(decoder_speed))
+    print('speedup: {:.2f}x'.format(decoder_speed / json_util_speed))
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+""" Job page parser benchmark
+
+Parse the fixture pages of examples/benchmark/pages from html to job dict, as JobSpider.parse does without the
+crawler, and check the jobs against pages/expected.json. Then measure the pages/second and the memory allocated
+while parsing a page.
+
+The fixtures cover Stage, Thèse, CDD and CDI offers, with and without the optional fields, and with different
+line breaks. The script exits with an error when a job differs from the expected one, so a change of the parsing
+code can only be landed with --update, once the new output has been checked.
+
+"""
+from __future__ import print_function, unicode_literals, division
+
+import os
+import sys
+import json
+import argparse
+import timeit
+import tracemalloc
+
+from bson import json_util
+from sfbistats.loader import parse_job_page
+from sfbistats.loader.reparse import JSON_OPTIONS
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+EXPECTED_FILENAME = os.path.join(PAGES_DIR, 'expected.json')
+
+
+def read_pages():
+    """
+    Returns
+    -------
+    dict
+        {filename: raw bytes of the page}
+
+    """
+    pages = dict()
+    for filename in sorted(os.listdir(PAGES_DIR)):
+        if filename.endswith('.html'):
+            with open(os.path.join(PAGES_DIR, filename), 'rb') as page_file:
+                pages[filename] = page_file.read()
+    return pages
+
+
+def parse_page(filename, body):
+    # the link is made from the file name, so that it is part of the expected output
+    return parse_job_page(body.decode('utf-8'), 'http://www.sfbi.fr/content/' + filename[:-len('.html')]).to_dict()
+
+
+def to_json(job):
+    # dates as in the json database
+    return json.loads(json_util.dumps(job, json_options=JSON_OPTIONS))
+
+
+def check(pages, expected):
+    """
+    Returns
+    -------
+    list
+        messages describing the differences with the expected jobs, empty if there are none
+
+    """
+    errors = list()
+    for filename in sorted(set(pages) | set(expected)):
+        if filename not in expected:
+            errors.append('{}: no expected job'.format(filename))
+            continue
+        if filename not in pages:
+            errors.append('{}: page missing'.format(filename))
+            continue
+        job = to_json(parse_page(filename, pages[filename]))
+        for field in sorted(set(job) | set(expected[filename])):
+            if job.get(field) != expected[filename].get(field):
+                errors.append('{}: {} is {!r} instead of {!r}'.format(filename, field, job.get(field),
+                                                                      expected[filename].get(field)))
+    return errors
+
+
+def measure_memory(pages):
+    """
+    Returns
+    -------
+    float
+        mean number of bytes allocated by the parsing of a page, and not freed before the end
+    int
+        highest peak of memory allocated during the parsing of a page, in bytes
+
+    """
+    allocated = 0
+    peak = 0
+    tracemalloc.start()
+    try:
+        for filename, body in pages.items():
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            job = parse_page(filename, body)
+            current, page_peak = tracemalloc.get_traced_memory()
+            allocated += current - start
+            peak = max(peak, page_peak - start)
+            del job
+    finally:
+        tracemalloc.stop()
+    return allocated / len(pages), peak
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--repeat', type=int, default=5)
+    argparser.add_argument('--number', type=int, default=200, help='number of times each page is parsed per run')
+    argparser.add_argument('--update', action='store_true',
+                           help='write the current output to pages/expected.json instead of checking it')
+    args = vars(argparser.parse_args())
+    pages = read_pages()
+
+    if args['update']:
+        expected = dict((filename, to_json(parse_page(filename, body))) for filename, body in pages.items())
+        with open(EXPECTED_FILENAME, 'w', encoding='utf-8') as expected_file:
+            json.dump(expected, expected_file, ensure_ascii=False, indent=1, sort_keys=True)
+            expected_file.write('\n')
+        print('{} expected jobs written to {}'.format(len(expected), EXPECTED_FILENAME))
+        sys.exit(0)
+
+    with open(EXPECTED_FILENAME, 'r', encoding='utf-8') as expected_file:
+        errors = check(pages, json.load(expected_file))
+    if errors:
+        print('\n'.join(errors))
+        sys.exit('The output of the parser changed on {} fields. Run with --update if it is intended.'.format(
+            len(errors)))
+    print('{} pages parsed as expected'.format(len(pages)))
+
+    timer = timeit.Timer(lambda: [parse_page(filename, body) for filename, body in pages.items()])
+    best = min(timer.repeat(repeat=args['repeat'], number=args['number']))
+    speed = args['number'] * len(pages) / best
+    kilobytes = sum(len(body) for body in pages.values()) * args['number'] / best / 1024
+    print('{:.0f} pages/s ({:.0f} kB of html/s)'.format(speed, kilobytes))
+    allocated, peak = measure_memory(pages)
+    print('{:.0f} bytes kept and {} bytes at peak per page'.format(allocated, peak))
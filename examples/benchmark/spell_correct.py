@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+""" Spell correction benchmark
+
+Time the search of the close spellings of the cities with the SpellingIndex, compared to the comparison of all
+the pairs of cities, on synthetic city names: random names made of syllables, and misspelled copies of some of them.
+
+For the sizes where the pairwise comparison is run, the replacements decided with both methods are compared.
+For the bigger ones, the close spellings of a sample of cities are checked with get_close_spelling.
+
+Then the spell correction is timed with a CitySpellings memory: once when all the cities are new, and once
+on the same data set with 1% of new misspellings, which is the case of a daily load.
+
+"""
+from __future__ import print_function, unicode_literals, division
+
+import os
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from sfbistats.utils import get_close_spelling, get_close_spellings, get_city_replacements, CitySpellings
+
+CONSONANTS = ['b', 'c', 'd', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'w', 'z',
+              'ch', 'br', 'tr', 'gr', 'pl', 'st', 'cl', 'fr']
+VOWELS = ['a', 'e', 'i', 'o', 'u', 'y', 'ou', 'ai', 'eu', 'au', 'ie', 'ea']
+ENDINGS = ['', '', '', 'n', 'r', 's', 'x', 'l', 'gne', 'lle', 'nt', 'rt']
+
+
+def make_name(generator):
+    words = list()
+    for i in range(generator.choice([1, 1, 1, 2, 2, 3])):
+        word = ''.join(generator.choice(CONSONANTS) + generator.choice(VOWELS) for j in range(generator.randint(1, 3)))
+        words.append((word + generator.choice(ENDINGS)).title())
+    return ' '.join(words)
+
+
+def misspell(name, generator):
+    i = generator.randrange(len(name))
+    letter = generator.choice('abcdefghijklmnopqrstuvwxyz')
+    edit = generator.choice(['insert', 'delete', 'replace'])
+    if edit == 'insert':
+        return name[:i] + letter + name[i:]
+    if edit == 'delete':
+        return name[:i] + name[i + 1:]
+    return name[:i] + letter + name[i + 1:]
+
+
+def make_city_dict(size, seed=0):
+    """
+    Returns
+    -------
+    dict
+        {city: count} with size distinct cities. A third of them are misspellings, seen only once.
+
+    """
+    generator = random.Random(seed)
+    city_dict = dict()
+    names = list()
+    while len(city_dict) < size:
+        if names and generator.random() < 1 / 3:
+            name = misspell(generator.choice(names), generator)
+            count = 1
+        else:
+            name = make_name(generator)
+            names.append(name)
+            count = generator.randint(1, 100)
+        if name and name not in city_dict:
+            city_dict[name] = count
+    return city_dict
+
+
+def add_new_cities(city_dict, new_count, seed=1):
+    generator = random.Random(seed)
+    new_city_dict = dict(city_dict)
+    cities = list(city_dict)
+    while len(new_city_dict) < len(city_dict) + new_count:
+        new_city_dict[misspell(generator.choice(cities), generator)] = 1
+    return new_city_dict
+
+
+def time_spellings(city_dict, new_count):
+    """
+    Returns
+    -------
+    float
+        seconds taken by the spell correction of city_dict, without memory
+    float
+        seconds taken by the spell correction of city_dict with new_count more cities, with the memory of the
+        first one
+
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        spellings_filename = os.path.join(directory, 'city_spellings.json')
+        start = time.perf_counter()
+        get_city_replacements(city_dict, spellings=CitySpellings(spellings_filename))
+        cold_time = time.perf_counter() - start
+        new_city_dict = add_new_cities(city_dict, new_count)
+        start = time.perf_counter()
+        replace_dict = get_city_replacements(new_city_dict, spellings=CitySpellings(spellings_filename))
+        warm_time = time.perf_counter() - start
+        assert replace_dict == get_city_replacements(new_city_dict)
+    finally:
+        shutil.rmtree(directory)
+    return cold_time, warm_time
+
+
+def pairwise_close_spellings(city_dict):
+    return dict((city, get_close_spelling(city, city_dict)) for city in city_dict)
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    argparser.add_argument('--max_pairwise', type=int, default=1000,
+                           help='Largest size for which all the pairs of cities are compared.')
+    argparser.add_argument('--sample', type=int, default=10,
+                           help='Number of cities checked with get_close_spelling for the larger sizes.')
+    args = vars(argparser.parse_args())
+
+    for size in args['sizes']:
+        city_dict = make_city_dict(size)
+        start = time.perf_counter()
+        close_spellings = get_close_spellings(city_dict)
+        index_time = time.perf_counter() - start
+        replace_dict = get_city_replacements(city_dict, close_spellings)
+        print('{} cities: SpellingIndex {:.2f}s, {} replacements'.format(size, index_time, len(replace_dict)))
+        if size <= args['max_pairwise']:
+            start = time.perf_counter()
+            pairwise = pairwise_close_spellings(city_dict)
+            pairwise_time = time.perf_counter() - start
+            same = (pairwise == close_spellings
+                    and get_city_replacements(city_dict, pairwise) == replace_dict)
+            print('    pairwise {:.2f}s, speedup {:.1f}x, same replacements: {}'.format(
+                pairwise_time, pairwise_time / index_time, same))
+        else:
+            sample = random.Random(1).sample(list(city_dict), min(args['sample'], size))
+            same = all(get_close_spelling(city, city_dict) == close_spellings[city] for city in sample)
+            print('    same close spellings on a sample of {} cities: {}'.format(len(sample), same))
+        new_count = max(1, size // 100)
+        cold_time, warm_time = time_spellings(city_dict, new_count)
+        print('    CitySpellings: {:.2f}s when empty, {:.2f}s for {} new cities (file read and written)'.format(
+            cold_time, warm_time, new_count))
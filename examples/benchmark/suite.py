@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+""" Benchmark suite
+
+Time the main stages of the processing on synthetic databases of growing sizes (see synthetic.py):
+ - load_from_json
+ - the sanitizers, one value at a time and on a whole pandas Series
+ - spell_correct, with an empty CitySpellings memory
+ - build_lex_dic on the titles, when the dependencies of examples/misc/lexical_analysis.py are installed
+ - the pandas aggregations of examples/misc/summary.py and time_series.py
+
+The cities are located with a copy of the package's city_locations.csv, and the unknown ones with an offline
+geocoder putting them abroad: nothing is fetched from the network, and the files of the package are left unchanged.
+
+The results are written to a json file with the git commit, the versions of python and of the libraries, so that
+they can be compared with those of another run with --compare.
+
+"""
+from __future__ import print_function, unicode_literals, division
+
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import argparse
+import datetime
+import platform
+import tempfile
+import contextlib
+import subprocess
+import collections
+
+import numpy as np
+import pandas as pd
+
+from sfbistats.utils import (CityIndex, CitySpellings, Geocoder, load_from_json, decode_job,
+                             sanitize_city_name, sanitize_city_name_for_geoloc, sanitize_duration, spell_correct,
+                             sanitize_city_names, sanitize_durations)
+from sfbistats.utils.city_index import get_city_filename
+from sfbistats.utils.utils import default_sanitizer
+
+import synthetic
+
+EXAMPLES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class AbroadGeocoder(Geocoder):
+    """
+    Offline geocoder, locating every city abroad, as the loader does for the cities outside France.
+    """
+
+    def locate(self, name):
+        return 'Étranger', 'Étranger'
+
+
+def get_lex_dic_builder():
+    """
+    Returns build_lex_dic from examples/misc/lexical_analysis.py, or None if its dependencies are missing.
+    """
+    sys.path.insert(0, os.path.join(EXAMPLES_DIR, 'misc'))
+    try:
+        from lexical_analysis import build_lex_dic
+    except ImportError as e:
+        print('build_lex_dic skipped: {}'.format(e))
+        return None
+    finally:
+        sys.path.pop(0)
+    return build_lex_dic
+
+
+def summary_counts(df):
+    # the counts of examples/misc/summary.py
+    df.contract_type.value_counts()
+    df[df.contract_type == 'CDI'].contract_subtype.value_counts()
+    df[df.contract_type == 'CDD'].contract_subtype.value_counts()
+    df.city.value_counts()
+    df.contract_subtype.value_counts()
+    df.groupby('region').contract_type.value_counts().unstack(level=-1).fillna(0)
+
+
+def monthly_counts(df):
+    # the time series of examples/misc/time_series.py
+    counts = pd.DataFrame({'count': df.groupby(['contract_type', 'submission_date']).size()}).reset_index()
+    counts = counts.pivot(index='submission_date', columns='contract_type', values='count')
+    counts.index = pd.to_datetime(counts.index)
+    counts.groupby(counts.index.to_period('M')).sum()
+
+
+def run_size(size, args, work_dir):
+    """
+    Returns
+    -------
+    list
+        {'size', 'step', 'seconds', 'records_per_second'} dicts
+
+    """
+    results = list()
+
+    def bench(step, func, *func_args):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            value = func(*func_args)
+        seconds = time.perf_counter() - start
+        results.append({'size': size, 'step': step, 'seconds': seconds, 'records_per_second': size / seconds})
+        print('{:>10} {:<32} {:8.3f}s {:12.0f} records/s'.format(size, step, seconds, size / seconds))
+        return value
+
+    data_filename = os.path.join(args['data_dir'] or work_dir, 'synthetic-{}-{}.json'.format(size, args['seed']))
+    if not os.path.exists(data_filename):
+        with open(data_filename, 'w', encoding='utf-8') as data_file:
+            bench('generate', lambda: data_file.writelines(synthetic.generate(args['model'], size, args['seed'])))
+
+    # a fresh city reference for each size, so that the unknown cities are located every time
+    city_filename = os.path.join(work_dir, '{}-city_locations.csv'.format(size))
+    shutil.copy(get_city_filename(), city_filename)
+    city_index = CityIndex(city_filename, geocoder=AbroadGeocoder())
+    with open(data_filename, 'r', encoding='utf-8') as data_file:
+        job_list = bench('load_from_json', load_from_json, data_file, city_index)
+
+    with open(data_filename, 'r', encoding='utf-8') as data_file:
+        raw_jobs = [decode_job(l) for l in data_file if l.strip()]
+    raw_cities = [job['city'] for job in raw_jobs]
+    raw_durations = [job['duration'] for job in raw_jobs]
+    default_sanitizer.clear()
+    cities = bench('sanitize_city_name', lambda: [sanitize_city_name(city) for city in raw_cities])
+    bench('sanitize_city_name_for_geoloc', lambda: [sanitize_city_name_for_geoloc(city) for city in cities])
+    bench('sanitize_duration', lambda: [sanitize_duration(duration) for duration in raw_durations])
+    default_sanitizer.clear()
+    cities = bench('sanitize_city_names', sanitize_city_names, pd.Series(raw_cities)).tolist()
+    bench('sanitize_durations', sanitize_durations, pd.Series(raw_durations))
+
+    city_jobs = [{'city': city} for city in cities]
+    city_dict = collections.Counter(cities)
+    spellings = CitySpellings(os.path.join(work_dir, '{}-city_spellings.json'.format(size)))
+    bench('spell_correct', spell_correct, city_jobs, city_dict, spellings)
+
+    if args['build_lex_dic'] is not None:
+        bench('build_lex_dic', args['build_lex_dic'], [job['title'] for job in job_list])
+
+    df = bench('DataFrame', pd.DataFrame, job_list)
+    bench('summary_counts', summary_counts, df)
+    bench('monthly_counts', monthly_counts, df)
+    return results
+
+
+def get_metadata():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=EXAMPLES_DIR,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'date': datetime.datetime.now().isoformat(),
+            'commit': commit,
+            'python': sys.version,
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__}
+
+
+def compare(results, previous, threshold):
+    """
+    Print the ratio of the times of results to those of previous, for the (size, step) couples run in both.
+    """
+    previous_times = dict(((r['size'], r['step']), r['seconds']) for r in previous['results'])
+    print('Compared to commit {} ({}):'.format(previous['metadata']['commit'], previous['metadata']['date']))
+    for r in results['results']:
+        key = (r['size'], r['step'])
+        if key not in previous_times:
+            continue
+        ratio = r['seconds'] / previous_times[key]
+        flag = 'SLOWER' if ratio > 1 + threshold else 'faster' if ratio < 1 - threshold else ''
+        print('{:>10} {:<32} {:8.3f}s -> {:8.3f}s  x{:.2f} {}'.format(r['size'], r['step'], previous_times[key],
+                                                                    r['seconds'], ratio, flag))
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--json', required=True, help='real database the synthetic ones are fitted to')
+    argparser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--data_dir', help='Where the synthetic databases are kept between runs. '
+                                              'Defaults to a temporary directory.')
+    argparser.add_argument('--output', help='json file the results are written to')
+    argparser.add_argument('--compare', help='json file of the results of a previous run')
+    argparser.add_argument('--threshold', type=float, default=0.2,
+                           help='relative change of time reported by --compare')
+    args = vars(argparser.parse_args())
+
+    with open(args['json'], 'r', encoding='utf-8') as real_file:
+        args['model'] = synthetic.fit(real_file)
+    args['build_lex_dic'] = get_lex_dic_builder()
+    work_dir = tempfile.mkdtemp()
+    try:
+        results = {'metadata': get_metadata(), 'results': list()}
+        for size in args['sizes']:
+            results['results'] += run_size(size, args, work_dir)
+    finally:
+        shutil.rmtree(work_dir)
+    if args['output']:
+        with open(args['output'], 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+    if args['compare']:
+        with open(args['compare'], 'r', encoding='utf-8') as previous_file:
+            compare(results, json.load(previous_file), args['threshold'])
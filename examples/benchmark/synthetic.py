@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+""" Synthetic data
+
+Generate job offer databases of any size, in the mongoexport json format of resources/jobs_anon.json.
+
+The distributions are fitted to a real database:
+ - the (contract type, subtype) couples are drawn with their frequencies in the real data, and so are the
+ duration strings of each contract type
+ - the titles are random walks on the word bigrams of the real titles of the same contract type
+ - the city strings are drawn with their frequencies, and some of them are misspelled (typo, letter case, dashes,
+ postcode, cedex) as often as the real data has spellings seen only once
+ - the submission dates are real ones moved by up to 15 days, and the other dates keep the offsets they have
+ in a real job
+
+"""
+from __future__ import print_function, unicode_literals, division
+
+import argparse
+import collections
+import itertools
+import json
+import random
+
+DAY = 86400000
+DATE_FIELDS = ['starting_date', 'limit_date', 'validity_date']
+# same order as mongoexport
+FIELDS = ['submission_date', 'starting_date', 'title', 'limit_date', 'validity_date', 'contract_type', 'duration',
+          'contract_subtype', 'city']
+MAX_TITLE_WORDS = 20
+
+
+class Distribution(object):
+    """
+    Draw values with the frequencies they were counted with.
+    """
+
+    def __init__(self, counter):
+        self.values = list(counter.keys())
+        self.cum_weights = list(itertools.accumulate(counter.values()))
+
+    def draw(self, generator):
+        return generator.choices(self.values, cum_weights=self.cum_weights)[0]
+
+
+def to_ms(value):
+    # '' for missing dates, as in the real data
+    if isinstance(value, dict):
+        return value['$date']
+    return None
+
+
+def fit(file):
+    """
+    Learn the distributions of a real json database.
+
+    Parameters
+    ----------
+    file : file handler
+
+    Returns
+    -------
+    dict
+
+    """
+    contracts = collections.Counter()
+    durations = collections.defaultdict(collections.Counter)
+    bigrams = collections.defaultdict(lambda: collections.defaultdict(collections.Counter))
+    cities = collections.Counter()
+    dates = list()
+    for l in file:
+        if not l.strip():
+            continue
+        # keep the {'$date': ms} dicts as they are
+        job = json.loads(l)
+        contract_type = job['contract_type']
+        contracts[(contract_type, job['contract_subtype'])] += 1
+        durations[contract_type][job['duration']] += 1
+        words = [None] + job['title'].split() + [None]
+        for previous, word in zip(words[:-1], words[1:]):
+            bigrams[contract_type][previous][word] += 1
+        cities[job['city']] += 1
+        submission = to_ms(job['submission_date'])
+        offsets = tuple(None if to_ms(job[name]) is None else to_ms(job[name]) - submission for name in DATE_FIELDS)
+        dates.append((submission, offsets))
+    singletons = sum(1 for count in cities.values() if count == 1)
+    return {'contracts': Distribution(contracts),
+            'durations': dict((contract_type, Distribution(counter)) for contract_type, counter in durations.items()),
+            'titles': dict((contract_type, dict((previous, Distribution(counter))
+                                                for previous, counter in transitions.items()))
+                           for contract_type, transitions in bigrams.items()),
+            'cities': Distribution(cities),
+            'misspelling_rate': singletons / sum(cities.values()),
+            'dates': dates}
+
+
+def make_title(transitions, generator):
+    words = list()
+    word = transitions[None].draw(generator)
+    while word is not None and len(words) < MAX_TITLE_WORDS:
+        words.append(word)
+        word = transitions[word].draw(generator)
+    return ' '.join(words)
+
+
+def misspell(city, generator):
+    kind = generator.choice(['typo', 'case', 'dash', 'postcode', 'cedex'])
+    if kind == 'typo' and city:
+        i = generator.randrange(len(city))
+        letter = generator.choice('abcdefghijklmnopqrstuvwxyz')
+        return generator.choice([city[:i] + letter + city[i:], city[:i] + city[i + 1:],
+                                 city[:i] + letter + city[i + 1:]])
+    if kind == 'case':
+        return generator.choice([city.upper(), city.lower()])
+    if kind == 'dash':
+        return city.replace(' ', '-') if ' ' in city else city.replace('-', ' ')
+    if kind == 'postcode':
+        return '{:05d} {}'.format(generator.randrange(1000, 96000), city)
+    return city + ' Cedex'
+
+
+def make_job(model, generator):
+    """
+    Returns
+    -------
+    dict
+        a job as decoded by json.loads, dates being {'$date': ms} dicts
+
+    """
+    contract_type, contract_subtype = model['contracts'].draw(generator)
+    submission, offsets = generator.choice(model['dates'])
+    submission += generator.randint(-15, 15) * DAY
+    city = model['cities'].draw(generator)
+    if generator.random() < model['misspelling_rate']:
+        city = misspell(city, generator)
+    job = {'submission_date': {'$date': submission},
+           'title': make_title(model['titles'][contract_type], generator),
+           'contract_type': contract_type,
+           'duration': model['durations'][contract_type].draw(generator),
+           'contract_subtype': contract_subtype,
+           'city': city}
+    for name, offset in zip(DATE_FIELDS, offsets):
+        job[name] = '' if offset is None else {'$date': submission + offset}
+    return job
+
+
+def format_value(value):
+    if isinstance(value, dict):
+        return '{ ' + ', '.join('"{}" : {}'.format(key, format_value(v)) for key, v in value.items()) + ' }'
+    return json.dumps(value, ensure_ascii=False)
+
+
+def format_job(job):
+    """
+    Returns
+    -------
+    string
+        the job as written by mongoexport, on one line
+
+    """
+    return '{ ' + ', '.join('"{}" : {}'.format(name, format_value(job[name])) for name in FIELDS) + ' }'
+
+
+def generate(model, count, seed=0):
+    """
+    Generator yielding count lines of a synthetic database, new lines included.
+    """
+    generator = random.Random(seed)
+    for i in range(count):
+        yield format_job(make_job(model, generator)) + '\n'
+
+
+def write_synthetic(real_filename, output_filename, count, seed=0):
+    with open(real_filename, 'r', encoding='utf-8') as real_file:
+        model = fit(real_file)
+    with open(output_filename, 'w', encoding='utf-8') as output_file:
+        output_file.writelines(generate(model, count, seed))
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--json', required=True, help='real database the distributions are fitted to')
+    argparser.add_argument('--count', type=int, required=True, help='number of jobs to generate')
+    argparser.add_argument('--output', required=True)
+    argparser.add_argument('--seed', type=int, default=0)
+    args = vars(argparser.parse_args())
+    write_synthetic(args['json'], args['output'], args['count'], args['seed'])
@@ -1,10 +1,45 @@
 # coding=utf-8
 from __future__ import division, print_function
 import re
+import sys
 import datetime
 
+# labels of the fields of a job page, in the order of the page. None of them is the beginning of another one.
+SUBMISSION_LABEL = 'Soumis par'
+FIELD_LABELS = (SUBMISSION_LABEL, 'Type de poste', 'Durée du poste', 'Ville', 'Date de début', 'Laboratoire',
+                'Nom et prénom du contact', 'Date limite de candidature', 'Date de validité')
+FIELD_LABEL_PATTERN = re.compile('|'.join(re.escape(label) for label in FIELD_LABELS))
+SUBMISSION_PATTERN = re.compile('Soumis par (.+) le .+(\\d\\d/\\d\\d/\\d+)')
+DATE_PATTERN = re.compile('(\\d\\d)/(\\d\\d)/(\\d+)')
+
+
+def intern_string(value):
+    """
+    Contract types and subtypes take only a few different values: intern them so that all jobs share the same
+    string objects.
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def parse_date(date_string):
+    """
+    Returns the first dd/mm/yyyy date found in date_string, as datetime.datetime.strptime(date, '%d/%m/%Y') would
+    parse it, without the cost of strptime in the common case of a four digits year.
+    """
+    m = DATE_PATTERN.search(date_string)
+    day, month, year = m.groups()
+    if len(year) != 4:
+        # let strptime raise its error
+        return datetime.datetime.strptime(m.group(0), '%d/%m/%Y')
+    return datetime.datetime(int(year), int(month), int(day))
+
 
 class JobOffer(object):
+    __slots__ = ('http_link', 'title', 'user', 'submission_date', 'contract_type', 'contract_sub_type', 'duration',
+                 'city', 'starting_date', 'lab', 'contact_name', 'limit_date', 'validity_date', 'description')
+
     def __init__(self):
         self.http_link = ''
         self.title = ''
@@ -27,13 +62,14 @@ class JobOffer(object):
         :param json:
         :return:
         """
-        job = JobOffer()
+        # all the fields are set here, no need to go through __init__
+        job = object.__new__(JobOffer)
         job.http_link = json['http_link']
         job.title = json['title']
         job.user = json['user']
         job.submission_date = json['submission_date'].date()
-        job.contract_type = json['contract_type']
-        job.contract_sub_type = json['contract_subtype']
+        job.contract_type = intern_string(json['contract_type'])
+        job.contract_sub_type = intern_string(json['contract_subtype'])
         job.duration = json['duration']
         job.city = json['city']
         job.starting_date = json['starting_date']
@@ -63,74 +99,103 @@ class JobOffer(object):
         # the mail initial object, job and announce title
         # ex: 'Bioinformatics developer', 'Working on annotation pipeline'...
         job.title = job_string_list[1]
+        fields, job.description = JobOffer.index_fields(job_string_list)
+
+        def seek(label, offset):
+            # same as seek_info(label, job_string_list, offset)
+            if label not in fields:
+                return None
+            return job_string_list[fields[label] + offset]
 
         # the sfbi user who submitted the announce
-        submission_string = job.seek_info('^Soumis par', job_string_list, 0)
+        submission_string = seek(SUBMISSION_LABEL, 0)
         if not submission_string:
             raise Exception('User field not found!')
-        m = re.search('Soumis par (.+) le .+(\d\d/\d\d/\d+)', submission_string)
+        m = SUBMISSION_PATTERN.search(submission_string)
         job.user = m.group(1)
-        job.submission_date = datetime.datetime.strptime(m.group(2), '%d/%m/%Y')
+        job.submission_date = parse_date(m.group(2))
 
         # from now on, the index can change.
         # CDD and CDI have subtypes, thus making the list longer by adding additional fields
         # stage and thèse don't have subtypes
-        type = job.seek_info('Type de poste', job_string_list, 1)
+        type = intern_string(seek('Type de poste', 1))
         if type == 'Stage' or type == 'Thèse':
             job.contract_type = type
             job.contract_sub_type = ''
         else:
             job.contract_type = type
-            job.contract_sub_type = job.seek_info('Type de poste', job_string_list, 3)
+            job.contract_sub_type = intern_string(seek('Type de poste', 3))
 
         # field Durée du poste may not be present for CDI. Some CDI have it, with indéterminée.
         # empty is not applicable (for CDI)
-        duration_string = job.seek_info('Durée du poste', job_string_list, 1)
+        duration_string = seek('Durée du poste', 1)
         if duration_string:
             job.duration = duration_string
         else:
             job.duration = ''
 
-        city_string = job.seek_info('Ville', job_string_list, 1)
+        city_string = seek('Ville', 1)
         if not city_string:
             raise Exception('Ville field not found!')
         job.city = city_string.title()
 
-        starting_date_string = job.seek_info('Date de début', job_string_list, 1)
+        starting_date_string = seek('Date de début', 1)
         if starting_date_string:
-            m = re.search('(\d\d/\d\d/\d+)', starting_date_string)
-            job.starting_date = datetime.datetime.strptime(m.group(1), '%d/%m/%Y')
+            job.starting_date = parse_date(starting_date_string)
         else:
             job.starting_date = ''
 
-        lab_string = job.seek_info('Laboratoire', job_string_list, 1)
+        lab_string = seek('Laboratoire', 1)
         if lab_string:
             job.lab = lab_string.title()
         else:
             job.lab = ''
 
-        contact_name_string = job.seek_info('Nom et prénom du contact', job_string_list, 1)
+        contact_name_string = seek('Nom et prénom du contact', 1)
         if not contact_name_string:
             raise Exception('Nom du contact field not found!')
         job.contact_name = contact_name_string.title()
 
-        limit_date_string = job.seek_info('Date limite de candidature', job_string_list, 1)
+        limit_date_string = seek('Date limite de candidature', 1)
         if limit_date_string:
-            m = re.search('(\d\d/\d\d/\d+)', limit_date_string)
-            job.limit_date = datetime.datetime.strptime(m.group(1), '%d/%m/%Y')
+            job.limit_date = parse_date(limit_date_string)
         else:
             job.limit_date = ''
 
-        validity_date_string = job.seek_info('Date de validité', job_string_list, 1)
+        validity_date_string = seek('Date de validité', 1)
         if validity_date_string:
-            m = re.search('(\d\d/\d\d/\d+)', validity_date_string)
-            job.validity_date = datetime.datetime.strptime(m.group(1), '%d/%m/%Y')
+            job.validity_date = parse_date(validity_date_string)
         else:
             job.validity_date = ''
 
-        job.description = job.get_full_description(job_string_list)
         return job
 
+    @staticmethod
+    def index_fields(job_string_list):
+        """
+        Same as seek_info for all the labels of FIELD_LABELS, and get_full_description, in a single pass.
+        :param job_string_list: list of all elements parsed from the html page, stripped from html markup
+        :return: {label: index of the first element starting with label, before the description},
+        and the description
+        """
+        fields = dict()
+        description_start = None
+        for i, e in enumerate(job_string_list):
+            if e.startswith('Description'):
+                if description_start is None:
+                    description_start = i
+                # we arrived at the Description anarchic field, the rest doesn't interest us
+                if e.startswith('Description du poste:'):
+                    break
+                continue
+            m = FIELD_LABEL_PATTERN.match(e)
+            if m and m.group() not in fields:
+                fields[m.group()] = i
+        if description_start is None:
+            return fields, ''
+        # the elements starting with Description are skipped, as in get_full_description
+        return fields, ''.join(e for e in job_string_list[description_start + 1:] if not e.startswith('Description'))
+
     def __str__(self):
         return (">>title: " + self.title +
                 "\n- user: " + self.user +
@@ -211,6 +276,12 @@ class JobOfferAnon(object):
     mongoexport --db sfbi_jobs --collection jobs --out jobs_anon.json
     --fields submission_date,contract_type,city,title,limit_date,starting_date,contract_subtype,validity_date,duration
     """
+    __slots__ = ('title', 'submission_date', 'contract_type', 'contract_sub_type', 'duration', 'city',
+                 'starting_date', 'limit_date', 'validity_date')
+    # the keys of to_dict, in the same order
+    DICT_KEYS = ('title', 'submission_date', 'contract_type', 'contract_subtype', 'duration', 'city',
+                 'starting_date', 'limit_date', 'validity_date')
+
     def __init__(self):
         self.title = ''
         self.submission_date = None
@@ -228,11 +299,12 @@ class JobOfferAnon(object):
         :param json:
         :return:
         """
-        job = JobOfferAnon()
+        # all the fields are set here, no need to go through __init__
+        job = object.__new__(JobOfferAnon)
         job.title = json['title']
         job.submission_date = json['submission_date'].date()
-        job.contract_type = json['contract_type']
-        job.contract_sub_type = json['contract_subtype']
+        job.contract_type = intern_string(json['contract_type'])
+        job.contract_sub_type = intern_string(json['contract_subtype'])
         job.duration = json['duration']
         job.city = json['city']
         job.starting_date = json['starting_date']
@@ -240,6 +312,47 @@ class JobOfferAnon(object):
         job.validity_date = json['validity_date']
         return job
 
+    @staticmethod
+    def columns_from_json(json_list):
+        """
+        Build the fields of many decoded json documents at once, one column per field, without a JobOfferAnon
+        or a dict per job. The values are the same as those of JobOfferAnon.from_json(json).to_dict().
+        :param json_list: list of dict
+        :return: dict {key of to_dict: list of the values of the jobs, in the order of json_list}
+        """
+        columns = dict((key, [json[key] for json in json_list]) for key in JobOfferAnon.DICT_KEYS)
+        columns['submission_date'] = [date.date() for date in columns['submission_date']]
+        columns['contract_type'] = [intern_string(value) for value in columns['contract_type']]
+        columns['contract_subtype'] = [intern_string(value) for value in columns['contract_subtype']]
+        return columns
+
+    @staticmethod
+    def dicts_from_json(json_list):
+        """
+        Same as [JobOfferAnon.from_json(json).to_dict() for json in json_list], without building the JobOfferAnon.
+        The contract types and subtypes are interned once per distinct value.
+        :param json_list: iterable of dict
+        :return: list of dict
+        """
+        interned = dict()
+
+        def intern(value):
+            result = interned.get(value)
+            if result is None:
+                result = interned[value] = intern_string(value)
+            return result
+
+        return [{"title": json['title'],
+                 "submission_date": json['submission_date'].date(),
+                 "contract_type": intern(json['contract_type']),
+                 "contract_subtype": intern(json['contract_subtype']),
+                 "duration": json['duration'],
+                 "city": json['city'],
+                 "starting_date": json['starting_date'],
+                 "limit_date": json['limit_date'],
+                 "validity_date": json['validity_date'],
+                 } for json in json_list]
+
     @staticmethod
     def from_JobOffer(normal_job):
         jobAnon = JobOfferAnon()
@@ -1,3 +1,9 @@
-from .main import MongoDBStorage, clear_db
 from .sfbi_parser import EmlParser
-from .spider import JobSpider, HTMLStripper
+from .extractor import JobPageExtractor, extract_job_strings, parse_job_page
+from .page_store import PageStore, get_page_store_filename
+from .reparse import reparse, reparse_to_json
+try:
+    from .main import MongoDBStorage, clear_db
+    from .spider import JobSpider
+except ImportError:
+    pass # scrapy is only installed with the all option, the pages can still be parsed without it
@@ -0,0 +1,73 @@
+# coding=utf-8
+""" Job page extractor
+
+Get the text of the job section of a sfbi.fr page, from the <h1 class="title"> of the job to the sidebar.
+
+The page is read with the events of an HTMLParser: the start tags switch the extraction on and off, and only the
+text nodes found in between are kept, so the result doesn't depend on how the site breaks the lines of the html.
+The character references (&eacute;, &amp;...) are converted by the parser, inside the text nodes only.
+The parser only starts at the first h1 tag of the page, and stops at the sidebar: the rest of the page is never parsed.
+
+"""
+from __future__ import unicode_literals, division, print_function
+import re
+from html.parser import HTMLParser
+
+from ..job_offer import JobOffer
+
+# nothing is extracted before the first h1 tag
+H1_PATTERN = re.compile('<h1', re.IGNORECASE)
+
+
+class EndOfJob(Exception):
+    pass
+
+
+class JobPageExtractor(HTMLParser):
+    """
+    Collect the text nodes of the job section of a page, whitespace collapsed as a browser would display them.
+    """
+
+    def __init__(self):
+        super(JobPageExtractor, self).__init__(convert_charrefs=True)
+        self.in_job = False
+        self.job_strings = list()
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'h1' and ('class', 'title') in attrs:
+            self.in_job = True
+        elif self.in_job and tag == 'div' and ('class', 'region region-sidebar-first column sidebar') in attrs:
+            self.in_job = False
+            raise EndOfJob()
+
+    def handle_data(self, data):
+        if self.in_job:
+            data = ' '.join(data.split())
+            if data:
+                self.job_strings.append(data)
+
+
+def extract_job_strings(html):
+    """
+    :param html: the decoded page
+    :return: list of the non empty text elements of the job section, as expected by JobOffer.from_job_string_list
+    """
+    extractor = JobPageExtractor()
+    m = H1_PATTERN.search(html)
+    if m is None:
+        return extractor.job_strings
+    try:
+        extractor.feed(html[m.start():])
+        extractor.close()
+    except EndOfJob:
+        pass
+    return extractor.job_strings
+
+
+def parse_job_page(html, http_link):
+    """
+    :param html: the decoded page
+    :param http_link: the page's link
+    :return: JobOffer
+    """
+    return JobOffer.from_job_string_list(extract_job_strings(html), http_link)
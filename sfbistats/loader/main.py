@@ -1,18 +1,26 @@
 # coding=utf-8
 from __future__ import division, print_function, unicode_literals
 
+import sys
 import pymongo
+import pymongo.errors
 import argparse
 from sfbistats.loader import spider
 from sfbistats.loader.sfbi_parser import EmlParser
+from sfbistats.loader.page_store import PageStore
 
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.log import configure_logging
 
+DUPLICATE_KEY_ERROR = 11000
+
 
 class MongoDBStorage(object):
     """
     see http://doc.scrapy.org/en/latest/topics/item-pipeline.html#write-items-to-mongodb
+
+    The jobs are upserted on their http_link, which has a unique index (see create_link_index): crawling a page
+    again replaces its job, so a crawl that crashed can simply be run again.
     """
 
     def __init__(self, settings):
@@ -20,15 +28,72 @@ class MongoDBStorage(object):
         mongo_client = pymongo.MongoClient()
         sfbi_db = mongo_client[self.db_name]
         self.job_collection = sfbi_db[settings.get('COLLECTION_NAME')]
+        create_link_index(self.job_collection)
 
     def process_item(self, item, spider):
-        self.job_collection.insert_one(item)
+        self.job_collection.replace_one({'http_link': item['http_link']}, item, upsert=True)
         return item
 
     @classmethod
     def from_crawler(cls, crawler):
         return cls(crawler.settings)
 
+
+class DuplicateLinksError(Exception):
+    pass
+
+
+def create_link_index(collection):
+    """
+    Create the unique index on http_link. Only the string links are indexed, so the documents without a link
+    don't conflict with each other. The collections filled before the index existed can have the same page stored
+    several times: nothing is deleted then, DuplicateLinksError is raised (see remove_duplicate_links).
+    """
+    try:
+        collection.create_index('http_link', unique=True, partialFilterExpression={'http_link': {'$type': 'string'}})
+    except pymongo.errors.OperationFailure as e:
+        if e.code != DUPLICATE_KEY_ERROR:
+            raise
+        raise DuplicateLinksError("Some jobs of " + collection.full_name + " are stored several times with the same "
+                                  "http_link, so the unique index on it can't be created. "
+                                  "Run with --dedupe to keep only the last stored copy of each.")
+
+
+def find_duplicate_links(collection):
+    """
+    :return: dict {http_link: list of the _id of its copies but the last inserted one}, for the string links
+    stored several times. The documents without a link are left out.
+    """
+    duplicates = collection.aggregate([{'$match': {'http_link': {'$type': 'string'}}},
+                                       {'$group': {'_id': '$http_link', 'ids': {'$push': '$_id'},
+                                                   'count': {'$sum': 1}}},
+                                       {'$match': {'count': {'$gt': 1}}}],
+                                      allowDiskUse=True)
+    # ObjectIds grow with the insertion time
+    return dict((group['_id'], sorted(group['ids'])[:-1]) for group in duplicates)
+
+
+def remove_duplicate_links(collection):
+    """
+    Delete all the copies of each http_link but the last inserted one, printing the links and their number of
+    deleted copies.
+    :return: the number of deleted documents
+    """
+    deleted = 0
+    for link, old_ids in sorted(find_duplicate_links(collection).items()):
+        print("Removing " + str(len(old_ids)) + " older copies of " + link)
+        deleted += collection.delete_many({'_id': {'$in': old_ids}}).deleted_count
+    return deleted
+
+
+def get_known_links(collection):
+    """
+    :return: set of the http_link of the jobs already stored, read with a projection on this field only.
+    They are the links of the mails, as JobSpider stores them, even for the pages reached through a redirect.
+    """
+    cursor = collection.find({'http_link': {'$exists': True}}, projection={'http_link': True, '_id': False})
+    return set(document['http_link'] for document in cursor)
+
 '''
     clean mongodb stuff
 '''
@@ -43,15 +108,34 @@ if __name__ == '__main__':
     argparser = argparse.ArgumentParser()
     argparser.add_argument('--eml_dir', required=True)
     argparser.add_argument('--db_name', required=True)
+    argparser.add_argument('--page_store', help='where the raw pages are kept, '
+                                                'defaults to pages.sqlite in the cache directory')
+    argparser.add_argument('--recrawl', action='store_true', help='crawl all the links, even those already stored')
+    argparser.add_argument('--dedupe', action='store_true',
+                           help='delete the older copies of the jobs stored several times with the same link, '
+                                'listing them, before crawling')
     args = vars(argparser.parse_args())
     eml_dir = args['eml_dir']
     db_name = args['db_name']
     collection_name = 'jobs'
     configure_logging({'LOG_FILE': 'loader.log'})
 
+    job_collection = pymongo.MongoClient()[db_name][collection_name]
+    if args['dedupe']:
+        print(str(remove_duplicate_links(job_collection)) + " duplicated jobs removed")
+    try:
+        # here rather than in the pipeline, whose errors only go to the log file
+        create_link_index(job_collection)
+    except DuplicateLinksError as e:
+        sys.exit(str(e))
+
     print ("Parsing mails...")
     parser = EmlParser.from_mbox(eml_dir)
     link_list = parser.get_link_list()
+    if not args['recrawl']:
+        known_links = get_known_links(job_collection)
+        link_list = [link for link in link_list if link not in known_links]
+        print(str(len(link_list)) + " new links, " + str(len(known_links)) + " jobs already stored")
 
     process = CrawlerProcess({
         'USER_AGENT': 'Mozilla/4.0 (compatible; MSIE 7.0; Windows NT 5.1)',
@@ -66,8 +150,10 @@ if __name__ == '__main__':
         # 'DOWNLOADER_MIDDLEWARES': {'scrapy.downloadermiddlewares.redirect.RedirectMiddleware': 1}
     })
 
-    process.crawl(spider.JobSpider, start_urls=link_list)
+    page_store = PageStore(args['page_store'])
+    process.crawl(spider.JobSpider, start_urls=link_list, page_store=page_store)
     process.start()  # the script will block here until the crawling is finished
+    page_store.close()
 
     #clear_db(mongo_client)
 
@@ -0,0 +1,106 @@
+# coding=utf-8
+""" Page store
+
+Local copy of the raw pages fetched by the spider, so that the job database can be derived again from them
+(see reparse.py) when the parsing changes, without crawling sfbi.fr again.
+
+The pages are stored in a SQLite database, compressed with zlib, keyed by url and fetch time: a page fetched
+again is added next to its previous versions.
+
+"""
+from __future__ import unicode_literals, division, print_function
+import os
+import time
+import zlib
+import sqlite3
+
+
+def get_page_store_filename():
+    """
+    Returns the default path of the page store: pages.sqlite in the cache directory (see utils.cache.get_cache_dir).
+    """
+    from ..utils.cache import get_cache_dir
+    return os.path.join(get_cache_dir(), 'pages.sqlite')
+
+
+def decode_page(compressed_body, encoding):
+    """
+    :param compressed_body: the body of the page as stored
+    :param encoding: the encoding of the page, as given by the response
+    :return: the html of the page, as a string
+    """
+    return zlib.decompress(compressed_body).decode(encoding)
+
+
+class PageStore(object):
+    """
+    SQLite database of the raw pages, compressed.
+    """
+
+    def __init__(self, db_filename=None):
+        """
+        :param db_filename: defaults to get_page_store_filename()
+        """
+        if db_filename is None:
+            db_filename = get_page_store_filename()
+        self.db_filename = db_filename
+        self._connection = None
+
+    @property
+    def connection(self):
+        """
+        The sqlite connection, opened on first use. It may be used by another thread than the one that opened it,
+        such as the task thread of multiprocessing.Pool.imap, but only by one thread at a time.
+        """
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.db_filename))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._connection = sqlite3.connect(self.db_filename, timeout=30, check_same_thread=False)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS pages '
+                                     '(url TEXT, fetched REAL, encoding TEXT, body BLOB, PRIMARY KEY (url, fetched))')
+        return self._connection
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(DISTINCT url) FROM pages').fetchone()[0]
+
+    def put(self, url, body, encoding, fetched=None):
+        """
+        :param url: the page's link
+        :param body: the raw bytes of the page
+        :param encoding: the encoding of body
+        :param fetched: the fetch time, in seconds since epoch. Defaults to now.
+        """
+        if fetched is None:
+            fetched = time.time()
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)',
+                                    (url, fetched, encoding, zlib.compress(body)))
+
+    def iter_compressed(self, latest=True):
+        """
+        Generator yielding the stored pages, still compressed, in the order of their urls.
+        :param latest: only yield the last version of each page
+        :return: generator of (url, fetched, encoding, compressed body) tuples, see decode_page
+        """
+        if latest:
+            query = ('SELECT p.url, p.fetched, p.encoding, p.body FROM pages p '
+                     'JOIN (SELECT url, MAX(fetched) AS fetched FROM pages GROUP BY url) l '
+                     'ON p.url = l.url AND p.fetched = l.fetched ORDER BY p.url')
+        else:
+            query = 'SELECT url, fetched, encoding, body FROM pages ORDER BY url, fetched'
+        for row in self.connection.execute(query):
+            yield row
+
+    def iter_pages(self, latest=True):
+        """
+        Same as iter_compressed, with the pages decoded.
+        :return: generator of (url, fetched, html) tuples
+        """
+        for url, fetched, encoding, body in self.iter_compressed(latest):
+            yield url, fetched, decode_page(body, encoding)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,82 @@
+# coding=utf-8
+""" Offline re-parse
+
+Parse again all the pages of the page store into jobs, with a pool of processes, and write them as a json database
+in the mongoexport format read by utils.load_from_json. Nothing is fetched from the network.
+
+"""
+from __future__ import division, print_function, unicode_literals
+import argparse
+import multiprocessing
+
+from bson import json_util
+
+from .extractor import parse_job_page
+from .page_store import PageStore, decode_page
+
+# dates as {"$date": <milliseconds since epoch>}, as mongoexport writes them
+JSON_OPTIONS = json_util.LEGACY_JSON_OPTIONS
+
+
+def _parse_page(row):
+    """
+    Parse one page of the store, in a worker process.
+    :param row: (url, fetched, encoding, compressed body) tuple, as given by PageStore.iter_compressed
+    :return: (url, job dict or None, error message or None)
+    """
+    url, fetched, encoding, body = row
+    try:
+        return url, parse_job_page(decode_page(body, encoding), url).to_dict(), None
+    except Exception as e:
+        return url, None, '{}: {}'.format(type(e).__name__, e)
+
+
+def reparse(page_store, processes=None, chunksize=16):
+    """
+    Generator yielding the parsing results of the last version of every page of the store.
+    The pages are decompressed and parsed by the worker processes.
+    :param page_store: PageStore
+    :param processes: number of worker processes, defaults to the number of CPUs
+    :param chunksize: number of pages sent to a worker at once
+    :return: generator of (url, job dict or None, error message or None), in the order of the urls
+    """
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap(_parse_page, page_store.iter_compressed(latest=True), chunksize):
+            yield result
+    finally:
+        pool.terminate()
+
+
+def reparse_to_json(page_store, output_filename, processes=None):
+    """
+    Write the jobs of all the pages of the store into output_filename, one json document per line.
+    The pages that can't be parsed are reported and skipped.
+    :return: (number of jobs written, number of pages that failed)
+    """
+    job_count = 0
+    failures = 0
+    with open(output_filename, 'w', encoding='utf-8') as output_file:
+        for url, job, error in reparse(page_store, processes):
+            if job is None:
+                failures += 1
+                print('Could not parse ' + url + ': ' + error)
+                continue
+            output_file.write(json_util.dumps(job, json_options=JSON_OPTIONS, ensure_ascii=False) + '\n')
+            job_count += 1
+    return job_count, failures
+
+
+if __name__ == '__main__':
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--page_store', help='defaults to pages.sqlite in the cache directory')
+    argparser.add_argument('--output', required=True, help='json file the jobs are written to')
+    argparser.add_argument('--processes', type=int)
+    args = vars(argparser.parse_args())
+
+    page_store = PageStore(args['page_store'])
+    print("Parsing " + str(len(page_store)) + " pages...")
+    job_count, failures = reparse_to_json(page_store, args['output'], args['processes'])
+    print(str(job_count) + " jobs written, " + str(failures) + " pages could not be parsed")
+    page_store.close()
@@ -1,11 +1,42 @@
 
-from .utils import (sanitize_city_name,
+from .utils import (default_sanitizer,
+                    sanitize_city_name,
                     sanitize_city_name_for_geoloc,
                     sanitize_duration,
                     get_colors,
                     query_GoogleV3,
                     city_to_dep_region,
+                    resolve_dep_region,
                     levenshtein,
+                    is_close_spelling,
                     get_close_spelling,
+                    get_city_replacements,
                     spell_correct,
-                    load_from_json)
+                    load_from_json,
+                    iter_jobs,
+                    decode_job,
+                    decode_jobs,
+                    sanitize_job,
+                    sanitize_job_fields,
+                    locate_jobs,
+                    count_cities,
+                    resolve_unknown_cities)
+from .city_index import CityIndex
+from .city_spellings import CitySpellings
+from .sanitizer import Sanitizer
+from .aliases import AliasMatcher, read_aliases, get_alias_filename
+from .spelling import SpellingIndex, get_close_spellings, levenshtein_many
+from .decoder import job_object_hook, decode_json_line
+from .geocoder import (Geocoder,
+                       GoogleV3Geocoder,
+                       GazetteerGeocoder,
+                       CachingGeocoder,
+                       ThrottledGeocoder,
+                       resolve_cities)
+from .columns import load_columns
+from .bulk import apply_unique, sanitize_city_names, sanitize_durations
+from .parallel import load_from_json_parallel
+from .cache import load_with_cache
+from .line_index import LineIndex
+from .incremental import load_incremental
+from .dedup import MinHasher, find_near_duplicates, drop_near_duplicates
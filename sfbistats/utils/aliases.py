@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+""" Aliases
+
+The substitutions used to make city names recognizable by geocoders (Montpelllier -> Montpellier,
+Ile de France -> Paris, the separators of several cities...). They are read from city_aliases.csv, and compiled
+into a trie so that all of them are applied in a single left to right pass over the name.
+
+Each line of the file is: alias, replacement, match.
+match is either 'word': the alias is matched case-insensitively, as a whole word (as with \\b in a regex),
+or 'exact': the alias is matched as is, anywhere in the name.
+
+All the aliases are matched against the original name only: the replacement of an alias is never matched by
+another one. Before, the 'exact' aliases were applied after the 'word' ones, on their output, so that
+Génopôle D'Evry Orsay gave Génopôle D'Evry, then Evry. Such chains are listed in the file as aliases of their own.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import csv
+import pkg_resources
+
+WORD = 'word'
+EXACT = 'exact'
+
+
+def get_alias_filename():
+    """
+    Returns the path of the city_aliases.csv file shipped with the package.
+
+    Returns
+    -------
+    string
+
+    """
+    return pkg_resources.resource_filename('sfbistats.utils', 'city_aliases.csv')
+
+
+def read_aliases(alias_filename=None):
+    """
+    Parameters
+    ----------
+    alias_filename : string
+        Defaults to the city_aliases.csv file of the package.
+
+    Returns
+    -------
+    list
+        (alias, replacement, match) tuples, in the order of the file
+
+    """
+    if alias_filename is None:
+        alias_filename = get_alias_filename()
+    aliases = list()
+    with open(alias_filename, 'r', encoding='utf-8', newline='') as alias_file:
+        for l in csv.reader(alias_file):
+            if not l:
+                continue
+            alias, replacement, match = l
+            if not alias:
+                raise ValueError('Empty alias in {}'.format(alias_filename))
+            if match not in (WORD, EXACT):
+                raise ValueError('Unknown match type {} for alias {}'.format(match, alias))
+            aliases.append((alias, replacement, match))
+    return aliases
+
+
+def is_word_char(c):
+    # same definition as \w for unicode strings
+    return c.isalnum() or c == '_'
+
+
+class AliasMatcher(object):
+    """
+    Replace all the aliases of a name in one pass.
+
+    At each position of the name, the trie is walked as far as the name allows, and the longest alias
+    matching there is replaced. When no alias matches, the character is kept and the next position is tried.
+    The cost of a name thus depends on its length and on the length of the aliases, not on their number.
+    """
+
+    def __init__(self, aliases):
+        """
+        Parameters
+        ----------
+        aliases : list
+            (alias, replacement, match) tuples, as returned by read_aliases
+        """
+        # nested dicts keyed by lowercased characters, the None key holding the aliases ending there
+        self.trie = dict()
+        for alias, replacement, match in aliases:
+            node = self.trie
+            for c in alias:
+                node = node.setdefault(c.lower(), dict())
+            node.setdefault(None, list()).append((alias, replacement, match))
+
+    @classmethod
+    def from_file(cls, alias_filename=None):
+        return cls(read_aliases(alias_filename))
+
+    def _is_boundary(self, name, i):
+        before = i > 0 and is_word_char(name[i - 1])
+        after = i < len(name) and is_word_char(name[i])
+        return before != after
+
+    def _longest_match(self, name, lowered, start):
+        """
+        Returns
+        -------
+        tuple
+            (end, replacement) of the longest alias matching at start, or None
+
+        """
+        best = None
+        node = self.trie
+        end = start
+        while True:
+            for alias, replacement, match in node.get(None, ()):
+                if match == EXACT:
+                    if name[start:end] == alias:
+                        best = (end, replacement)
+                        break
+                elif self._is_boundary(name, start) and self._is_boundary(name, end):
+                    best = (end, replacement)
+                    break
+            if end == len(name) or lowered[end] not in node:
+                return best
+            node = node[lowered[end]]
+            end += 1
+
+    def replace(self, name):
+        lowered = [c.lower() for c in name]
+        parts = list()
+        i = 0
+        while i < len(name):
+            match = self._longest_match(name, lowered, i) if lowered[i] in self.trie else None
+            if match is None:
+                parts.append(name[i])
+                i += 1
+            else:
+                end, replacement = match
+                parts.append(replacement)
+                i = end
+        return ''.join(parts)
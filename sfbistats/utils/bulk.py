@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+""" Bulk
+
+Sanitizers working on a whole column (pandas Series or array of strings) at once.
+
+Raw values repeat a lot, so the column is factorized: the rules are applied once per distinct value,
+and the results are mapped back to the rows.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import numpy as np
+
+from .utils import default_sanitizer
+
+
+def _factorize(values):
+    """
+    Returns
+    -------
+    numpy.array
+        code of each value, -1 for missing values
+    pandas.Series
+        the distinct values, as strings
+    pandas.Index
+        the index of the result
+
+    """
+    import pandas as pd
+    if isinstance(values, pd.Series):
+        index = values.index
+    else:
+        values = pd.Series(values, dtype=object)
+        index = values.index
+    codes, uniques = pd.factorize(values)
+    return codes, pd.Series(uniques, dtype=object), index
+
+
+def _map_back(unique_results, codes, index, name=None):
+    """
+    Expand the results of the distinct values to the whole column. Missing values stay missing.
+    """
+    import pandas as pd
+    unique_results = np.asarray(unique_results)
+    if (codes < 0).any():
+        if unique_results.dtype.kind in 'iu':
+            unique_results = unique_results.astype(float)
+        # the code of missing values is -1: they get this last element
+        unique_results = np.append(unique_results, np.nan if unique_results.dtype.kind == 'f' else None)
+    return pd.Series(unique_results[codes], index=index, name=name)
+
+
+def apply_unique(values, func, name=None):
+    """
+    Apply func once per distinct value of a column, and map the results back to each row.
+
+    Parameters
+    ----------
+    values : pandas.Series or array-like
+    func : callable
+    name : string
+        name of the returned Series
+
+    Returns
+    -------
+    pandas.Series
+
+    """
+    codes, uniques, index = _factorize(values)
+    unique_results = np.empty(len(uniques), dtype=object)
+    for i, value in enumerate(uniques):
+        unique_results[i] = func(value)
+    return _map_back(unique_results, codes, index, name)
+
+
+def sanitize_city_names(values, for_geoloc=True):
+    """
+    Same as sanitize_city_name on each value, followed by sanitize_city_name_for_geoloc if for_geoloc is True,
+    as done by load_from_json.
+
+    Parameters
+    ----------
+    values : pandas.Series or array-like of strings
+    for_geoloc : bool
+
+    Returns
+    -------
+    pandas.Series
+
+    """
+    if for_geoloc:
+        def func(value):
+            return default_sanitizer.city_name_for_geoloc(default_sanitizer.city_name(value))
+    else:
+        func = default_sanitizer.city_name
+    name = values.name if hasattr(values, 'name') else None
+    return apply_unique(values, func, name=name)
+
+
+def sanitize_durations(values):
+    """
+    Same as sanitize_duration on each value. The rules are run with vectorized str.extract on the distinct values,
+    in the same order of priority.
+
+    Parameters
+    ----------
+    values : pandas.Series or array-like of strings
+
+    Returns
+    -------
+    pandas.Series
+        int, or float if a duration is given in weeks (fractions of months)
+
+    """
+    codes, uniques, index = _factorize(values)
+    uniques = uniques.astype(str)
+    lower_uniques = uniques.str.lower()
+    sanitizer = default_sanitizer
+
+    def first_number(series, regex):
+        return series.str.extract(regex.pattern, flags=regex.flags, expand=True)[0].astype(float)
+
+    months = first_number(uniques, sanitizer.months_regex)
+    years = first_number(uniques, sanitizer.years_regex)
+    weeks = first_number(uniques, sanitizer.weeks_regex)
+    number = first_number(lower_uniques, sanitizer.number_regex)
+    permanent = lower_uniques.str.extract(sanitizer.permanent_regex.pattern, flags=sanitizer.permanent_regex.flags,
+                                          expand=True)[0].notna()
+
+    has_months = months.notna().to_numpy()
+    has_years = years.notna().to_numpy()
+    has_weeks = weeks.notna().to_numpy()
+    unique_results = np.select([has_months, has_years, has_weeks, number.notna().to_numpy(),
+                                permanent.to_numpy(dtype=bool)],
+                               [months.to_numpy(), years.to_numpy() * 12, weeks.to_numpy() / 4, number.to_numpy(), 0],
+                               default=-1)
+    # as with a list of sanitize_duration results: only durations in weeks give floats
+    if not (has_weeks & ~has_months & ~has_years).any():
+        unique_results = unique_results.astype(np.int64)
+    name = values.name if hasattr(values, 'name') else None
+    return _map_back(unique_results, codes, index, name)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+""" Cache
+
+Keep the sanitized dataset on disk, to avoid sanitizing the same file again and again.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import os
+import glob
+import pickle
+import hashlib
+import tempfile
+
+from .city_index import CityIndex
+from .aliases import get_alias_filename
+from .utils import load_from_json, SANITIZER_VERSION
+from .parallel import load_from_json_parallel
+
+
+def get_cache_dir():
+    """
+    Returns the directory where the sanitized datasets are stored.
+    Can be set with the SFBISTATS_CACHE_DIR environment variable, defaults to ~/.cache/sfbistats.
+
+    Returns
+    -------
+    string
+
+    """
+    cache_dir = os.environ.get('SFBISTATS_CACHE_DIR')
+    if not cache_dir:
+        cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'sfbistats')
+    return cache_dir
+
+
+def hash_file(filename):
+    """
+    Returns the sha256 hex digest of a file's content, or '' if the file doesn't exist.
+    """
+    sha = hashlib.sha256()
+    if not os.path.exists(filename):
+        return ''
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def hash_path(filename):
+    """
+    Returns a short hash of the absolute path of filename, to tell apart the files of the same name stored
+    in different directories.
+    """
+    return hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()[:12]
+
+
+def get_cache_key(filename, city_filename):
+    """
+    The key under which the sanitized dataset of filename is stored.
+    It changes whenever the data file, the city reference, the city aliases or the sanitizer version change.
+
+    Parameters
+    ----------
+    filename : string
+    city_filename : string
+
+    Returns
+    -------
+    string
+
+    """
+    sha = hashlib.sha256()
+    sha.update(hash_file(filename).encode('ascii'))
+    sha.update(hash_file(city_filename).encode('ascii'))
+    sha.update(hash_file(get_alias_filename()).encode('ascii'))
+    sha.update(str(SANITIZER_VERSION).encode('ascii'))
+    return sha.hexdigest()
+
+
+def get_cache_filename(filename, key, cache_dir):
+    return os.path.join(cache_dir, '{}-{}-{}.pickle'.format(os.path.basename(filename), hash_path(filename), key))
+
+
+def write_cache(job_list, cache_filename):
+    """
+    Store a job list column by column (one list per field), which is much faster to (un)pickle than
+    a list of dict. The file is replaced atomically.
+    Other versions of the same dataset are removed.
+    """
+    cache_dir = os.path.dirname(cache_filename)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    field_names = list(job_list[0].keys()) if job_list else list()
+    columns = dict((name, [job[name] for job in job_list]) for name in field_names)
+    fd, tmp_filename = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            pickle.dump({'field_names': field_names, 'columns': columns}, tmp_file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, cache_filename)
+    except:
+        os.remove(tmp_filename)
+        raise
+    # the file name is <data file name>-<path hash>-<key>.pickle, remove the ones of the same data file
+    # with a different key
+    prefix = cache_filename.rsplit('-', 1)[0]
+    for old_filename in glob.glob(glob.escape(prefix) + '-*.pickle'):
+        if old_filename != cache_filename:
+            os.remove(old_filename)
+
+
+def read_cache(cache_filename):
+    """
+    Load a job list stored by write_cache.
+
+    Returns
+    -------
+    list
+
+    """
+    with open(cache_filename, 'rb') as f:
+        data = pickle.load(f)
+    field_names = data['field_names']
+    columns = [data['columns'][name] for name in field_names]
+    return [dict(zip(field_names, values)) for values in zip(*columns)]
+
+
+def load_with_cache(filename, use_cache=True, cache_dir=None, city_index=None, processes=1):
+    """
+    Same as load_from_json, but the sanitized job list is read from the cache if the data file,
+    the city reference and the sanitizer version didn't change since it was stored.
+
+    Parameters
+    ----------
+    filename : string
+        Path of the json file of the serialized job list.
+    use_cache : bool
+        If False, the cache is neither read nor written.
+    cache_dir : string
+        Defaults to get_cache_dir().
+    city_index : CityIndex
+        The city reference used to find departments and regions. Defaults to the shared
+        index of the package's city_locations.csv.
+    processes : int
+        Number of processes used to sanitize the data when it is not in the cache.
+
+    Returns
+    -------
+    list
+
+    """
+    if city_index is None:
+        city_index = CityIndex.shared()
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+
+    if use_cache:
+        key = get_cache_key(filename, city_index.city_filename)
+        cache_filename = get_cache_filename(filename, key, cache_dir)
+        if os.path.exists(cache_filename):
+            return read_cache(cache_filename)
+
+    if processes > 1:
+        job_list = load_from_json_parallel(filename, processes=processes, city_index=city_index)
+    else:
+        with open(filename, 'r', encoding='utf-8') as f:
+            job_list = load_from_json(f, city_index=city_index)
+
+    if use_cache:
+        # the city file may have been completed during the load
+        key = get_cache_key(filename, city_index.city_filename)
+        write_cache(job_list, get_cache_filename(filename, key, cache_dir))
+    return job_list
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+""" City index
+
+In-memory index of the city_locations.csv reference file.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import os
+import csv
+import shutil
+import tempfile
+import pkg_resources
+
+
+def get_city_filename():
+    """
+    Returns the path of the city_locations.csv file shipped with the package.
+
+    Returns
+    -------
+    string
+
+    """
+    return pkg_resources.resource_filename('sfbistats.utils', 'city_locations.csv')
+
+
+class CityIndex(object):
+    """
+    Maps a city name to its (department, region) couple.
+
+    The csv file is parsed only once, when the index is created. Cities that are added afterwards
+    (typically after a geocoder query) are kept in a buffer, and written to the csv file all at once
+    when flush() is called.
+
+    Use CityIndex.shared() to get the instance common to the whole process, or build your own
+    instance and give it to load_from_json to control where the data comes from.
+
+    The geocoder attribute is the backend used by city_to_dep_region for the unknown cities (see the
+    geocoder module). None means the GoogleV3 API. The geocoder_workers attribute is the number of
+    threads querying it at once (see resolve_unknown_cities).
+    """
+
+    _shared_instances = dict()
+
+    def __init__(self, city_filename=None, geocoder=None, geocoder_workers=4):
+        if city_filename is None:
+            city_filename = get_city_filename()
+        self.city_filename = city_filename
+        self.geocoder = geocoder
+        self.geocoder_workers = geocoder_workers
+        self.city_dict = dict()
+        self.new_entries = list()
+        if os.path.exists(city_filename):
+            with open(city_filename, 'r', encoding='utf-8') as city_file:
+                for l in csv.reader(city_file):
+                    if not l:
+                        continue
+                    city, dep, reg = l
+                    self.city_dict[city] = (dep, reg)
+
+    @classmethod
+    def shared(cls, city_filename=None):
+        """
+        Returns the index of city_filename loaded in this process, creating it on first call.
+
+        Parameters
+        ----------
+        city_filename : string
+            Defaults to the city_locations.csv file of the package.
+
+        Returns
+        -------
+        CityIndex
+
+        """
+        if city_filename is None:
+            city_filename = get_city_filename()
+        key = os.path.abspath(city_filename)
+        if key not in cls._shared_instances:
+            cls._shared_instances[key] = cls(city_filename)
+        return cls._shared_instances[key]
+
+    def __contains__(self, name):
+        return name in self.city_dict
+
+    def __getitem__(self, name):
+        return self.city_dict[name]
+
+    def __len__(self):
+        return len(self.city_dict)
+
+    def get(self, name, default=None):
+        return self.city_dict.get(name, default)
+
+    def add(self, name, dep, reg):
+        """
+        Register a new city. It will be written to the csv file on the next flush().
+        """
+        if name in self.city_dict:
+            return
+        self.city_dict[name] = (dep, reg)
+        self.new_entries.append((name, dep, reg))
+
+    def flush(self):
+        """
+        Write the buffered cities at the end of the csv file.
+        The file is rewritten in a temporary file that then replaces the original one, so that
+        an interrupted run never leaves a half written reference file.
+        """
+        if not self.new_entries:
+            return
+        directory = os.path.dirname(os.path.abspath(self.city_filename))
+        fd, tmp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as tmp_file:
+                if os.path.exists(self.city_filename):
+                    with open(self.city_filename, 'r', encoding='utf-8', newline='') as city_file:
+                        content = city_file.read()
+                    tmp_file.write(content)
+                    if content and not content.endswith('\n'):
+                        tmp_file.write('\n')
+                writer = csv.writer(tmp_file, lineterminator='\n')
+                writer.writerows(self.new_entries)
+            if os.path.exists(self.city_filename):
+                shutil.copymode(self.city_filename, tmp_filename)
+            os.replace(tmp_filename, self.city_filename)
+        except:
+            os.remove(tmp_filename)
+            raise
+        self.new_entries = list()
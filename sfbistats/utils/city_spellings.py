@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+""" City spellings
+
+Persistent memory of the spell correction of the city names, stored in the cache directory (see
+cache.get_cache_dir), one json file per city_locations.csv reference file.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import os
+import json
+import shutil
+import tempfile
+import warnings
+
+from .city_index import get_city_filename
+from .spelling import SpellingIndex, is_close_spelling, MAX_CLOSE_DISTANCE
+
+
+def get_spellings_filename(city_filename=None):
+    """
+    Returns the path of the spellings learnt with city_filename, in the cache directory: the package directory
+    may be read-only.
+
+    Parameters
+    ----------
+    city_filename : string
+        Defaults to the city_locations.csv file of the package.
+
+    Returns
+    -------
+    string
+
+    """
+    from .cache import get_cache_dir, hash_path
+    if city_filename is None:
+        city_filename = get_city_filename()
+    return os.path.join(get_cache_dir(), 'city_spellings-{}.json'.format(hash_path(city_filename)))
+
+
+class CitySpellings(object):
+    """
+    Every city spelling ever seen by spell correction, with:
+     - the other spellings that is_close_spelling may accept, from it or from them, and their distances
+     - its number of occurrences, and the spelling it was replaced by (None if kept), in the last
+     data set where it was seen
+
+    The close spellings are what costs time to find. With this memory, only the spellings that were never
+    seen before are searched, among the known ones, so that the cost of spell correction follows the number of
+    new names instead of the size of the vocabulary. The replacements are still decided on the counts of
+    the current data set, and are the same as without memory.
+
+    Use CitySpellings.shared() to get the instance common to the whole process. The changes are written
+    to the file when flush() is called.
+    """
+
+    _shared_instances = dict()
+
+    def __init__(self, spellings_filename=None):
+        if spellings_filename is None:
+            spellings_filename = get_spellings_filename()
+        self.spellings_filename = spellings_filename
+        # {city: {'count': int, 'canonical': string, 'close': {other city: distance}}}
+        self.cities = dict()
+        self.changed = False
+        if os.path.exists(spellings_filename):
+            with open(spellings_filename, 'r', encoding='utf-8') as spellings_file:
+                self.cities = json.load(spellings_file)['cities']
+
+    @classmethod
+    def shared(cls, city_filename=None):
+        """
+        Returns the spellings learnt with city_filename, loaded in this process, creating them on first call.
+
+        Parameters
+        ----------
+        city_filename : string
+            Defaults to the city_locations.csv file of the package.
+
+        Returns
+        -------
+        CitySpellings
+
+        """
+        key = get_spellings_filename(city_filename)
+        if key not in cls._shared_instances:
+            cls._shared_instances[key] = cls(key)
+        return cls._shared_instances[key]
+
+    def __contains__(self, city):
+        return city in self.cities
+
+    def __len__(self):
+        return len(self.cities)
+
+    def learn(self, cities):
+        """
+        Find the close spellings of the cities that are not known yet.
+
+        Parameters
+        ----------
+        cities : iterable
+
+        Returns
+        -------
+        list
+            the new cities
+
+        """
+        new_cities = [city for city in cities if city not in self.cities]
+        if not new_cities:
+            return new_cities
+        index = SpellingIndex(self.cities)
+        # as in get_close_spellings, each new city is searched among the known cities and the shorter new ones
+        for city in sorted(new_cities, key=len):
+            self.cities[city] = {'count': 0, 'canonical': None, 'close': dict()}
+            if len(city) > 10:
+                matches = index.search(city, MAX_CLOSE_DISTANCE)
+            else:
+                # the known cities longer than 10 accept it at a larger distance
+                matches = index.search(city, 1) + index.search(city, MAX_CLOSE_DISTANCE, min_length=11)
+            for other, d in matches:
+                self.cities[city]['close'][other] = d
+                self.cities[other]['close'][city] = d
+            index.add(city)
+        self.changed = True
+        return new_cities
+
+    def get_close_spellings(self, city_dict):
+        """
+        Same as get_close_spellings, learning the new cities first.
+
+        Parameters
+        ----------
+        city_dict : dict
+            {city: count}
+
+        Returns
+        -------
+        dict
+            {city: list of its close spellings, in the order of city_dict}
+
+        """
+        self.learn(city_dict)
+        positions = dict((city, i) for i, city in enumerate(city_dict))
+        close_spellings = dict()
+        for city in city_dict:
+            close = self.cities[city]['close']
+            close_spellings[city] = sorted((other for other, d in close.items()
+                                            if other in positions and is_close_spelling(city, d)),
+                                           key=positions.get)
+        return close_spellings
+
+    def update(self, city_dict, replace_dict):
+        """
+        Remember the counts and the replacements decided for a data set.
+
+        Parameters
+        ----------
+        city_dict : dict
+            {city: count}
+        replace_dict : dict
+            {wrong spelling: correct spelling}
+
+        """
+        self.learn(city_dict)
+        for city, count in city_dict.items():
+            entry = self.cities[city]
+            canonical = replace_dict.get(city)
+            if entry['count'] != count or entry['canonical'] != canonical:
+                entry['count'] = count
+                entry['canonical'] = canonical
+                self.changed = True
+
+    def get_canonical_map(self):
+        """
+        Returns
+        -------
+        dict
+            {variant: canonical spelling}, as decided in the last data set where each variant was seen
+
+        """
+        return dict((city, entry['canonical']) for city, entry in self.cities.items() if entry['canonical'])
+
+    def flush(self):
+        """
+        Write the spellings to the json file, if they changed. As with CityIndex.flush, the file is replaced
+        atomically. If it can't be written, a warning is issued and the changes are kept for the next flush:
+        the memory only saves time.
+        """
+        if not self.changed:
+            return
+        try:
+            self._write()
+        except OSError as e:
+            warnings.warn('The city spellings could not be written to {}: {}'.format(self.spellings_filename, e))
+            return
+        self.changed = False
+
+    def _write(self):
+        directory = os.path.dirname(os.path.abspath(self.spellings_filename))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+                json.dump({'max_dist': MAX_CLOSE_DISTANCE, 'cities': self.cities}, tmp_file,
+                          ensure_ascii=False, sort_keys=True)
+            if os.path.exists(self.spellings_filename):
+                shutil.copymode(self.spellings_filename, tmp_filename)
+            else:
+                os.chmod(tmp_filename, 0o644)
+            os.replace(tmp_filename, self.spellings_filename)
+        except:
+            os.remove(tmp_filename)
+            raise
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+""" Columns
+
+Load the json database directly into typed columns, ready to be used by pandas.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import datetime
+from array import array
+import numpy as np
+
+from ..job_offer import JobOfferAnon
+from .city_index import CityIndex
+from .city_spellings import CitySpellings
+from .decoder import decode_json_line
+from .utils import (sanitize_city_name,
+                    sanitize_city_name_for_geoloc,
+                    sanitize_duration,
+                    city_to_dep_region,
+                    resolve_unknown_cities,
+                    get_city_replacements,
+                    iter_line_batches)
+
+# the value used by numpy to represent NaT in a datetime64 array
+NAT = np.iinfo(np.int64).min
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+US_PER_DAY = 86400 * 10 ** 6
+
+
+class CategoryBuffer(object):
+    """
+    Store a column of strings as integer codes, the categories being numbered in order of first appearance.
+    """
+
+    def __init__(self):
+        self.codes = array('q')
+        self.categories = dict()
+
+    def append(self, value):
+        code = self.categories.get(value)
+        if code is None:
+            code = len(self.categories)
+            self.categories[value] = code
+        self.codes.append(code)
+
+    def extend(self, values):
+        categories = self.categories
+        codes = list()
+        for value in values:
+            code = categories.get(value)
+            if code is None:
+                code = len(categories)
+                categories[value] = code
+            codes.append(code)
+        self.codes.extend(codes)
+
+    def get_counts(self):
+        """
+        Returns
+        -------
+        dict
+            {category: number of occurrences}, in order of first appearance
+
+        """
+        counts = np.bincount(np.frombuffer(self.codes, dtype=np.int64), minlength=len(self.categories))
+        return dict(zip(self.categories, counts.tolist()))
+
+    def take(self, indexes):
+        """
+        Returns
+        -------
+        CategoryBuffer
+            a buffer with the same categories, and the values at indexes
+        """
+        buffer = CategoryBuffer()
+        buffer.categories = self.categories
+        buffer.codes.frombytes(np.frombuffer(self.codes, dtype=np.int64)[indexes].tobytes())
+        return buffer
+
+    def to_categorical(self, replace_dict=None):
+        """
+        Build the pandas Categorical of the column.
+
+        Parameters
+        ----------
+        replace_dict : dict
+            {old category: new category}, applied to the categories instead of to each value
+
+        Returns
+        -------
+        pandas.Categorical
+
+        """
+        import pandas as pd
+        codes = np.frombuffer(self.codes, dtype=np.int64)
+        if replace_dict:
+            new_categories = dict()
+            mapping = np.empty(len(self.categories), dtype=np.int64)
+            for value, code in self.categories.items():
+                value = replace_dict.get(value, value)
+                mapping[code] = new_categories.setdefault(value, len(new_categories))
+            codes = mapping[codes]
+            categories = list(new_categories)
+        else:
+            categories = list(self.categories)
+        return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def date_to_us(value):
+    """
+    Convert a date or datetime to microseconds since epoch. Anything else (typically '') is NaT.
+    Microseconds and not nanoseconds, because some dates are wrong (ex: year 3017) and out of
+    the datetime64[ns] range.
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.replace(tzinfo=None) - value.utcoffset()
+        return (value - EPOCH) // datetime.timedelta(microseconds=1)
+    elif isinstance(value, datetime.date):
+        return (value.toordinal() - EPOCH_ORDINAL) * US_PER_DAY
+    return NAT
+
+
+def load_columns(file, city_index=None, spell_check=True):
+    """
+    Load a json database into a pandas DataFrame, without building a dict per job.
+
+    The jobs are sanitized exactly as in load_from_json, but each field is appended to a typed buffer while
+    the file is parsed:
+     - dates are datetime64[us] columns, with NaT for missing dates
+     - contract_type, contract_subtype, city, department and region are categorical
+     - duration is a float column (durations in weeks give fractions of months)
+    Departments, regions and spell correction are computed once per distinct city, not for each job.
+    Unknown cities are located concurrently once the whole file has been read (see resolve_unknown_cities).
+
+    Parameters
+    ----------
+    file : file handler
+        An already opened json file handler to the serialized job list.
+    city_index : CityIndex
+        The city reference used to find departments and regions. Defaults to the shared
+        index of the package's city_locations.csv.
+    spell_check : bool
+        Correct the city names with spell_correct's rules.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Same columns as the dicts returned by load_from_json.
+
+    """
+    import pandas as pd
+    if city_index is None:
+        city_index = CityIndex.shared()
+    title = list()
+    duration = array('d')
+    date_columns = dict((name, array('q')) for name in ('submission_date', 'starting_date',
+                                                        'limit_date', 'validity_date'))
+    category_columns = dict((name, CategoryBuffer()) for name in ('contract_type', 'contract_subtype', 'city'))
+    for lines in iter_line_batches(file):
+        # one list per field for the whole batch, instead of a record per job
+        job_columns = JobOfferAnon.columns_from_json([decode_json_line(l) for l in lines])
+        title.extend(job_columns['title'])
+        for name, buffer in date_columns.items():
+            buffer.extend(map(date_to_us, job_columns[name]))
+        category_columns['contract_type'].extend(job_columns['contract_type'])
+        category_columns['contract_subtype'].extend(job_columns['contract_subtype'])
+        category_columns['city'].extend(sanitize_city_name_for_geoloc(sanitize_city_name(city))
+                                        for city in job_columns['city'])
+        duration.extend(map(sanitize_duration, job_columns['duration']))
+
+    cities = category_columns['city']
+    try:
+        resolve_unknown_cities(cities.categories, city_index)
+    finally:
+        # new cities found by the geocoder are saved all at once
+        city_index.flush()
+    # one value per city, then one value per job
+    dep_buffer = CategoryBuffer()
+    reg_buffer = CategoryBuffer()
+    for city in cities.categories:
+        dep, reg = city_to_dep_region(city, city_index=city_index)
+        dep_buffer.append(dep)
+        reg_buffer.append(reg)
+    city_codes = np.frombuffer(cities.codes, dtype=np.int64)
+    category_columns['department'] = dep_buffer.take(city_codes)
+    category_columns['region'] = reg_buffer.take(city_codes)
+
+    replace_dict = None
+    if spell_check:
+        replace_dict = get_city_replacements(category_columns['city'].get_counts(),
+                                             spellings=CitySpellings.shared(city_index.city_filename))
+
+    columns = dict()
+    columns['title'] = np.array(title, dtype=object)
+    for name, buffer in date_columns.items():
+        columns[name] = np.frombuffer(buffer, dtype=np.int64).view('datetime64[us]')
+    for name, buffer in category_columns.items():
+        columns[name] = buffer.to_categorical(replace_dict if name == 'city' else None)
+    columns['duration'] = np.frombuffer(duration, dtype=np.float64)
+    return pd.DataFrame(columns, columns=['title', 'submission_date', 'contract_type', 'contract_subtype',
+                                          'duration', 'city', 'starting_date', 'limit_date', 'validity_date',
+                                          'department', 'region'])
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+""" Decoder
+
+Decode the lines of the mongoexport json database.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import json
+import datetime
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def job_object_hook(dct):
+    """
+    object_hook for json.loads, specialised for the dates of the mongoexport of the jobs, which are
+    always {"$date": <milliseconds since epoch>}.
+    Other MongoDB extended json shapes are handed to bson's json_util, imported only when needed.
+    Dates are returned as naive UTC datetime, like json_util does by default.
+
+    Parameters
+    ----------
+    dct : dict
+
+    Returns
+    -------
+    object
+
+    """
+    if '$date' in dct:
+        value = dct['$date']
+        if len(dct) == 1 and type(value) is int:
+            return EPOCH + datetime.timedelta(milliseconds=value)
+    elif not any(key[:1] == '$' for key in dct):
+        return dct
+    from bson import json_util
+    return json_util.object_hook(dct)
+
+
+def decode_json_line(line):
+    """
+    Parameters
+    ----------
+    line : string
+        One line of the json database.
+
+    Returns
+    -------
+    dict
+
+    """
+    return json.loads(line, object_hook=job_object_hook)
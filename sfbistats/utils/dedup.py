@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+""" Dedup
+
+Find job offers that were posted several times, with slightly different titles or descriptions.
+
+Comparing all the pairs of offers doesn't scale, so MinHash signatures and locality-sensitive hashing
+are used: only the offers sharing a band of their signatures are compared.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import re
+import zlib
+import collections
+import numpy as np
+
+# Mersenne prime used by the hash permutations, small enough so that a * x + b fits in 64 bits
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def get_shingles(text, shingle_size=5):
+    """
+    Returns the set of character shingles of a text, lowercased and with whitespaces collapsed.
+
+    Parameters
+    ----------
+    text : string
+    shingle_size : int
+
+    Returns
+    -------
+    set
+
+    """
+    text = re.sub(r'\s+', ' ', text.lower()).strip()
+    if len(text) <= shingle_size:
+        return {text} if text else set()
+    return set(text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1))
+
+
+def get_lsh_parameters(num_perm, threshold):
+    """
+    Choose the number of bands and of rows per band so that two texts with a jaccard similarity
+    around threshold have a 50% chance to share a band. The similarity at which this happens
+    is about (1 / bands) ** (1 / rows).
+
+    Returns
+    -------
+    int
+        number of bands
+    int
+        number of rows per band
+
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class MinHasher(object):
+    """
+    Compute MinHash signatures of texts. Two hashers with the same parameters give the same signatures.
+    """
+
+    def __init__(self, num_perm=128, shingle_size=5, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self.b = generator.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, text):
+        """
+        Returns
+        -------
+        numpy.array
+            num_perm unsigned ints
+
+        """
+        shingles = get_shingles(text, self.shingle_size)
+        if not shingles:
+            return np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint64)
+        # crc32 is stable between runs, unlike hash()
+        hashes = np.array([zlib.crc32(s.encode('utf-8')) % MERSENNE_PRIME for s in shingles], dtype=np.uint64)
+        return ((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME).min(axis=0)
+
+
+def get_job_text(job, fields):
+    """
+    Concatenate the text fields of a job, given either as a dict or as a JobOffer.
+    """
+    if isinstance(job, dict):
+        values = [job.get(field) for field in fields]
+    else:
+        values = [getattr(job, field, None) for field in fields]
+    return ' '.join(value for value in values if value)
+
+
+def find_near_duplicates(job_list, threshold=0.8, fields=('title', 'description'), num_perm=128, shingle_size=5):
+    """
+    Group the jobs whose texts are near duplicates.
+
+    Two jobs are duplicates when the estimated jaccard similarity of their shingles is at least threshold.
+    Duplicates are transitive: if A is a duplicate of B and B of C, all three are in the same cluster.
+
+    Parameters
+    ----------
+    job_list : list
+        dict (as returned by JobOffer.to_dict()) or JobOffer
+    threshold : float
+        minimum similarity, between 0 and 1
+    fields : tuple
+        the text fields that are compared
+    num_perm : int
+        size of the signatures, the higher the more precise the similarity estimation
+    shingle_size : int
+        number of characters of the shingles
+
+    Returns
+    -------
+    list
+        the cluster id of each job, which is the index of the first job of its cluster
+
+    """
+    hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+    texts = [get_job_text(job, fields) for job in job_list]
+    signatures = np.array([hasher.signature(text) for text in texts],
+                          dtype=np.uint64).reshape(len(job_list), num_perm)
+    # jobs without text are not duplicates of each other
+    indexes = [i for i, text in enumerate(texts) if text.strip()]
+    bands, rows = get_lsh_parameters(num_perm, threshold)
+
+    # union-find, the root of a cluster always being its smallest index
+    parents = list(range(len(job_list)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    # the jobs with the same signature, such as exact reposts, are duplicates without any comparison: only the
+    # first of them takes part in the buckets
+    first_indexes = dict()
+    for i in indexes:
+        first = first_indexes.setdefault(signatures[i].tobytes(), i)
+        if first != i:
+            parents[i] = first
+    indexes = list(first_indexes.values())
+
+    for band in range(bands):
+        buckets = collections.defaultdict(list)
+        band_signatures = signatures[:, band * rows:(band + 1) * rows]
+        for i in indexes:
+            buckets[band_signatures[i].tobytes()].append(i)
+        for candidates in buckets.values():
+            if len(candidates) < 2:
+                continue
+            # compare each job to the members of each other cluster met in the bucket, stopping at the first similar
+            # one: a job joins a cluster when it is similar to any of its members, and a cluster of near duplicates
+            # costs one comparison per job instead of one per pair
+            members = dict()
+            for i in candidates:
+                root_i = find(i)
+                for root in list(members):
+                    # root may have been merged into root_i by this loop
+                    if root == root_i or root not in members:
+                        continue
+                    # the band is only a hint, check the similarity of the whole signatures
+                    if any(np.mean(signatures[i] == signatures[j]) >= threshold for j in members[root]):
+                        new_root = min(root, root_i)
+                        parents[max(root, root_i)] = new_root
+                        cluster = members.pop(root) + members.pop(root_i, [])
+                        members[new_root] = cluster
+                        root_i = new_root
+                members.setdefault(root_i, list()).append(i)
+    return [find(i) for i in range(len(job_list))]
+
+
+def drop_near_duplicates(job_list, threshold=0.8, fields=('title', 'description')):
+    """
+    Keep only the first job of each cluster of near duplicates. See find_near_duplicates.
+
+    Returns
+    -------
+    list
+
+    """
+    cluster_ids = find_near_duplicates(job_list, threshold=threshold, fields=fields)
+    return [job for i, job in enumerate(job_list) if cluster_ids[i] == i]
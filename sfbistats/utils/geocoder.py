@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+""" Geocoder
+
+Backends used by city_to_dep_region to locate the cities that are not in city_locations.csv.
+
+A geocoder has a query(name) method returning a dict with the keys 'admin_lvl1' (region), 'admin_lvl2'
+(department), 'locality', 'colloquial' and 'country', empty strings when unknown, as query_GoogleV3 does.
+It raises NameError when nothing is found.
+Its locate(name) method turns the results of query into the (department, region) couple stored in
+city_locations.csv.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import os
+import re
+import csv
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import geopy.exc
+
+
+def normalize_city_key(name):
+    """
+    Key used to compare city names written in different ways:
+    Villeneuve-d'Ascq, Villeneuve D'Ascq and villeneuve d'ascq give the same key, as well as Évry and Evry.
+    """
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = name.lower().replace('-', ' ').replace('’', "'")
+    return re.sub(r'\s+', ' ', name).strip()
+
+
+class Geocoder(object):
+    """
+    Base class of the geocoders.
+    """
+
+    def query(self, name):
+        raise NotImplementedError
+
+    def locate(self, name):
+        from .utils import resolve_dep_region
+        return resolve_dep_region(name, self.query)
+
+
+class GoogleV3Geocoder(Geocoder):
+    """
+    Online geocoder, using the GoogleV3 API through geopy. This is the default one.
+    domain and scheme can point to another server speaking the same protocol, for example a local stub.
+    """
+
+    def __init__(self, domain='maps.google.fr', scheme=None, api_key=None, timeout=5):
+        self.domain = domain
+        self.scheme = scheme
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def query(self, name):
+        from .utils import query_GoogleV3
+        return query_GoogleV3(name, domain=self.domain, scheme=self.scheme, api_key=self.api_key,
+                              timeout=self.timeout)
+
+
+class RateLimiter(object):
+    """
+    Space out calls made from several threads, so that at most rate calls start per second.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'interval': self.interval}
+
+    def __setstate__(self, state):
+        self.interval = state['interval']
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class ThrottledGeocoder(Geocoder):
+    """
+    Limit the rate of the queries sent to another geocoder, whatever the number of threads using it.
+    Put it right in front of the network geocoder, ex: CachingGeocoder(ThrottledGeocoder(GoogleV3Geocoder(), 10)),
+    so that cache hits are not slowed down.
+    """
+
+    def __init__(self, geocoder, rate):
+        """
+        Parameters
+        ----------
+        geocoder : Geocoder
+        rate : float
+            maximum number of queries per second
+        """
+        self.geocoder = geocoder
+        self.limiter = RateLimiter(rate)
+
+    def query(self, name):
+        self.limiter.wait()
+        return self.geocoder.query(name)
+
+
+class GazetteerGeocoder(Geocoder):
+    """
+    Offline geocoder, locating french cities with a local list of communes, such as the INSEE
+    communes list with department and region names:
+    https://www.data.gouv.fr/fr/datasets/communes-de-france-base-des-codes-postaux/
+
+    The whole file is loaded in memory, indexed by normalize_city_key. When a name appears several times,
+    the first line wins.
+    """
+
+    def __init__(self, gazetteer_filename, city_column='nom_commune_complet', department_column='nom_departement',
+                 region_column='nom_region', delimiter=',', unknown_is_abroad=False):
+        """
+        Parameters
+        ----------
+        gazetteer_filename : string
+            csv file with a header line
+        city_column : string
+        department_column : string
+        region_column : string
+        delimiter : string
+        unknown_is_abroad : bool
+            If True, cities missing from the gazetteer are considered to be out of France,
+            instead of raising NameError.
+        """
+        self.unknown_is_abroad = unknown_is_abroad
+        self.city_dict = dict()
+        with open(gazetteer_filename, 'r', encoding='utf-8') as gazetteer_file:
+            for row in csv.DictReader(gazetteer_file, delimiter=delimiter):
+                key = normalize_city_key(row[city_column])
+                if key not in self.city_dict:
+                    self.city_dict[key] = (row[department_column], row[region_column])
+
+    def query(self, name):
+        d = dict()
+        d['admin_lvl1'] = ''
+        d['admin_lvl2'] = ''
+        d['locality'] = name
+        d['colloquial'] = ''
+        d['country'] = ''
+        key = normalize_city_key(name)
+        if key in self.city_dict:
+            d['admin_lvl2'], d['admin_lvl1'] = self.city_dict[key]
+            d['country'] = 'France'
+        elif not self.unknown_is_abroad:
+            raise NameError(name, 'Could not find city in gazetteer')
+        return d
+
+
+class CachingGeocoder(Geocoder):
+    """
+    Put a persistent SQLite cache in front of another geocoder.
+
+    Three things are stored, each one with its own time to live (in seconds, None to never expire):
+     - the raw responses of the geocoder's query
+     - the (department, region) couples found by locate
+     - the failures (NameError) of query and locate, so that a city that can't be located
+     doesn't cost a network round trip on every run
+    """
+
+    def __init__(self, geocoder=None, db_filename=None, response_ttl=180 * 86400, resolution_ttl=None,
+                 failure_ttl=30 * 86400):
+        """
+        Parameters
+        ----------
+        geocoder : Geocoder
+            Defaults to GoogleV3Geocoder.
+        db_filename : string
+            Defaults to geocoding.sqlite in the cache directory (see cache.get_cache_dir).
+        response_ttl : float
+        resolution_ttl : float
+        failure_ttl : float
+        """
+        if geocoder is None:
+            geocoder = GoogleV3Geocoder()
+        if db_filename is None:
+            from .cache import get_cache_dir
+            db_filename = os.path.join(get_cache_dir(), 'geocoding.sqlite')
+        self.geocoder = geocoder
+        self.db_filename = db_filename
+        self.ttl = {'response': response_ttl, 'resolution': resolution_ttl, 'failure': failure_ttl}
+        self._connection = None
+        # the connection is shared by the threads of resolve_cities
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        # the connection can't be sent to another process, it is opened again when needed
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self):
+        """
+        The sqlite connection, opened on first use. Use it with the lock held.
+        """
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.db_filename))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._connection = sqlite3.connect(self.db_filename, timeout=30, check_same_thread=False)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS geocoding '
+                                     '(kind TEXT, name TEXT, value TEXT, created REAL, PRIMARY KEY (kind, name))')
+        return self._connection
+
+    def get(self, kind, name):
+        """
+        Returns
+        -------
+        object
+            the cached value of this kind ('response', 'resolution', 'query_failure' or 'locate_failure')
+            for name, or None if missing or expired.
+
+        """
+        with self._lock:
+            row = self.connection.execute('SELECT value, created FROM geocoding WHERE kind = ? AND name = ?',
+                                          (kind, name)).fetchone()
+        if row is None:
+            return None
+        ttl = self.ttl['failure' if kind.endswith('failure') else kind]
+        if ttl is not None and row[1] + ttl < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, kind, name, value):
+        with self._lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO geocoding VALUES (?, ?, ?, ?)',
+                                    (kind, name, json.dumps(value), time.time()))
+
+    def query(self, name):
+        failure = self.get('query_failure', name)
+        if failure is not None:
+            raise NameError(*failure)
+        response = self.get('response', name)
+        if response is not None:
+            return response
+        try:
+            response = self.geocoder.query(name)
+        except NameError as e:
+            self.set('query_failure', name, list(e.args))
+            raise
+        self.set('response', name, response)
+        return response
+
+    def locate(self, name):
+        failure = self.get('locate_failure', name)
+        if failure is not None:
+            raise NameError(*failure)
+        resolution = self.get('resolution', name)
+        if resolution is not None:
+            return tuple(resolution)
+        try:
+            # the queries go through self.query, and thus through the cache
+            resolution = Geocoder.locate(self, name)
+        except NameError as e:
+            self.set('locate_failure', name, list(e.args))
+            raise
+        self.set('resolution', name, list(resolution))
+        return resolution
+
+    def prewarm(self, names):
+        """
+        Locate all the names, to fill the cache before a load.
+
+        Parameters
+        ----------
+        names : iterable
+            city names, already sanitized
+
+        Returns
+        -------
+        dict
+            {name: (department, region)} for the names that could be located
+
+        """
+        resolutions = dict()
+        for name in names:
+            try:
+                resolutions[name] = self.locate(name)
+            except NameError:
+                pass
+        return resolutions
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def locate_with_retry(geocoder, name, retries=3, backoff=1.0):
+    """
+    Call geocoder.locate, trying again after an error of the geocoding service (timeout, quota, unavailable...)
+    or of the network. The other errors, including NameError when the city can't be located, are not retried.
+
+    Parameters
+    ----------
+    geocoder : Geocoder
+    name : string
+    retries : int
+        number of tries after the first one
+    backoff : float
+        seconds to wait before the first retry, doubled after each retry
+
+    Returns
+    -------
+    tuple
+        (department, region)
+
+    """
+    for attempt in range(retries + 1):
+        try:
+            return geocoder.locate(name)
+        except (geopy.exc.GeocoderServiceError, OSError):
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def resolve_cities(names, geocoder=None, max_workers=4, retries=3, backoff=1.0):
+    """
+    Locate many cities concurrently with a pool of threads.
+
+    Parameters
+    ----------
+    names : iterable
+        city names, already sanitized
+    geocoder : Geocoder
+        Must be usable from several threads. Defaults to GoogleV3Geocoder, throttled to 10 queries per second.
+    max_workers : int
+    retries : int
+    backoff : float
+        see locate_with_retry
+
+    Returns
+    -------
+    dict
+        {name: (department, region)} for the cities that were located
+    dict
+        {name: exception} for the others
+
+    """
+    if geocoder is None:
+        geocoder = ThrottledGeocoder(GoogleV3Geocoder(), 10)
+    names = list(names)
+    resolutions = dict()
+    failures = dict()
+    if not names:
+        return resolutions, failures
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(name, executor.submit(locate_with_retry, geocoder, name, retries, backoff)) for name in names]
+        for name, future in futures:
+            try:
+                resolutions[name] = tuple(future.result())
+            except Exception as e:
+                failures[name] = e
+    return resolutions, failures
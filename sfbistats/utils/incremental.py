@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+""" Incremental
+
+Load a json database that only grows at the end, sanitizing only the lines added since the last load.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import io
+import os
+import pickle
+import hashlib
+import tempfile
+
+from .city_index import CityIndex
+from .aliases import get_alias_filename
+from .cache import get_cache_dir, hash_file, hash_path
+from .spelling import SpellingIndex, is_close_spelling, MAX_CLOSE_DISTANCE
+from .utils import (decode_jobs,
+                    iter_line_batches,
+                    sanitize_job_fields,
+                    locate_jobs,
+                    get_city_replacements,
+                    SANITIZER_VERSION)
+
+
+def get_checkpoint_filename(filename, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    return os.path.join(cache_dir, '{}-{}.checkpoint.pickle'.format(os.path.basename(filename), hash_path(filename)))
+
+
+def new_checkpoint():
+    return {'sanitizer_version': SANITIZER_VERSION,
+            'city_file_hash': '',
+            'alias_file_hash': '',
+            'offset': 0,
+            'prefix_hash': hashlib.sha256().hexdigest(),
+            'field_names': list(),
+            'columns': dict(),
+            'city_dict': dict(),
+            'spelling_index': SpellingIndex(),
+            'close_spellings': dict()}
+
+
+def read_checkpoint(checkpoint_filename):
+    if not os.path.exists(checkpoint_filename):
+        return None
+    with open(checkpoint_filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def write_checkpoint(checkpoint, checkpoint_filename):
+    directory = os.path.dirname(os.path.abspath(checkpoint_filename))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tmp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            pickle.dump(checkpoint, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, checkpoint_filename)
+    except:
+        os.remove(tmp_filename)
+        raise
+
+
+def update_close_spellings(close_spellings, city_dict, new_cities, index):
+    """
+    Complete close_spellings with the cities that were added at the end of city_dict.
+    The new cities are added to the index of the cities, and only the cities found near them are updated.
+    The lists keep the order of city_dict, as get_close_spelling does.
+
+    Parameters
+    ----------
+    close_spellings : dict
+        {city: get_close_spelling(city, city_dict)} for the cities that are not new. Modified in place.
+    city_dict : dict
+        {city: count}, new cities included
+    new_cities : list
+        the new cities, in the order of city_dict
+    index : SpellingIndex
+        the index of the cities that are not new. Modified in place.
+
+    """
+    for new_city in new_cities:
+        index.add(new_city)
+        close_spellings[new_city] = list()
+    new_city_set = set(new_cities)
+    positions = dict((city, i) for i, city in enumerate(city_dict))
+    for new_city in new_cities:
+        matches = sorted(index.search(new_city, MAX_CLOSE_DISTANCE), key=lambda match: positions[match[0]])
+        for city, dl in matches:
+            if is_close_spelling(new_city, dl):
+                close_spellings[new_city].append(city)
+            if city not in new_city_set and is_close_spelling(city, dl):
+                close_spellings[city].append(new_city)
+
+
+def load_incremental(filename, checkpoint_filename=None, city_index=None):
+    """
+    Same as load_from_json, but only the lines added to the file since the previous call are sanitized.
+
+    A checkpoint stores the sanitized jobs (before spell correction), the city counts, the close spellings of
+    each city, their SpellingIndex, the byte offset of the end of the processed lines and the hash of the file up to
+    that offset.
+    If the beginning of the file changed, or the sanitizer version, the city reference or the city aliases changed,
+    everything is processed again.
+    Only complete lines (ending with a new line) are processed.
+
+    Parameters
+    ----------
+    filename : string
+        Path of the json file of the serialized job list.
+    checkpoint_filename : string
+        Defaults to a file in get_cache_dir().
+    city_index : CityIndex
+        The city reference used to find departments and regions. Defaults to the shared
+        index of the package's city_locations.csv.
+
+    Returns
+    -------
+    list
+
+    """
+    if city_index is None:
+        city_index = CityIndex.shared()
+    if checkpoint_filename is None:
+        checkpoint_filename = get_checkpoint_filename(filename)
+
+    checkpoint = read_checkpoint(checkpoint_filename)
+    if (checkpoint is None
+            or 'spelling_index' not in checkpoint
+            or checkpoint['sanitizer_version'] != SANITIZER_VERSION
+            or checkpoint['city_file_hash'] != hash_file(city_index.city_filename)
+            or checkpoint.get('alias_file_hash') != hash_file(get_alias_filename())
+            or checkpoint['offset'] > os.path.getsize(filename)):
+        checkpoint = new_checkpoint()
+
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        remaining = checkpoint['offset']
+        while remaining:
+            block = f.read(min(remaining, 1 << 20))
+            sha.update(block)
+            remaining -= len(block)
+        if sha.hexdigest() != checkpoint['prefix_hash']:
+            # the file was not only appended to
+            checkpoint = new_checkpoint()
+            sha = hashlib.sha256()
+            f.seek(0)
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]
+    sha.update(data)
+
+    new_jobs = list()
+    for lines in iter_line_batches(io.StringIO(data.decode('utf-8'))):
+        new_jobs.extend(sanitize_job_fields(job) for job in decode_jobs(lines))
+    # the unknown cities of the new lines are located all at once, as in iter_jobs
+    locate_jobs(new_jobs, dict.fromkeys(job['city'] for job in new_jobs), city_index)
+    if new_jobs and not checkpoint['field_names']:
+        checkpoint['field_names'] = list(new_jobs[0].keys())
+        checkpoint['columns'] = dict((name, list()) for name in checkpoint['field_names'])
+    city_dict = checkpoint['city_dict']
+    new_cities = list()
+    for job in new_jobs:
+        for name in checkpoint['field_names']:
+            checkpoint['columns'][name].append(job[name])
+        if job['city'] not in city_dict:
+            city_dict[job['city']] = 0
+            new_cities.append(job['city'])
+        city_dict[job['city']] += 1
+    # the costly part of spell correction is only done for the new spellings
+    update_close_spellings(checkpoint['close_spellings'], city_dict, new_cities, checkpoint['spelling_index'])
+
+    checkpoint['offset'] += len(data)
+    checkpoint['prefix_hash'] = sha.hexdigest()
+    checkpoint['city_file_hash'] = hash_file(city_index.city_filename)
+    checkpoint['alias_file_hash'] = hash_file(get_alias_filename())
+    write_checkpoint(checkpoint, checkpoint_filename)
+
+    replace_dict = get_city_replacements(city_dict, checkpoint['close_spellings'])
+    field_names = checkpoint['field_names']
+    job_list = list()
+    for values in zip(*[checkpoint['columns'][name] for name in field_names]):
+        job = dict(zip(field_names, values))
+        if job['city'] in replace_dict:
+            job['city'] = replace_dict[job['city']]
+        job_list.append(job)
+    return job_list
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+""" Line index
+
+Random access to the jobs of the json database, through a sidecar file storing the offset of each line.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import os
+import mmap
+import tempfile
+import numpy as np
+
+from .decoder import decode_json_line
+from .utils import decode_job, decode_jobs
+
+
+def month_key(year, month):
+    return year * 12 + month - 1
+
+
+class LineIndex(object):
+    """
+    Offsets of each line of a json database, and of the jobs submitted each month.
+
+    The index is stored in a sidecar file (by default <json file>.idx.npz) and rebuilt only when
+    the size or modification time of the json file changed. The json file itself is memory-mapped,
+    so getting one job reads and decodes only its line.
+
+    Usage:
+        index = LineIndex('jobs_anon.json')
+        job = index[42]
+        jobs = index.get_month(2015, 3)
+    """
+
+    def __init__(self, filename, index_filename=None):
+        self.filename = filename
+        if index_filename is None:
+            index_filename = filename + '.idx.npz'
+        self.index_filename = index_filename
+        stat = os.stat(filename)
+        self.file_stamp = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+        if not self.load():
+            self.build()
+            self.save()
+        self._file = open(filename, 'rb')
+        if stat.st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:  # an empty file can't be mapped
+            self._map = b''
+
+    def load(self):
+        """
+        Load the sidecar file, if it exists and matches the json file.
+
+        Returns
+        -------
+        bool
+            False if the index needs to be rebuilt
+
+        """
+        if not os.path.exists(self.index_filename):
+            return False
+        with np.load(self.index_filename) as data:
+            if not np.array_equal(data['file_stamp'], self.file_stamp):
+                return False
+            self.offsets = data['offsets']
+            self.month_order = data['month_order']
+            self.months = data['months']
+            self.month_starts = data['month_starts']
+        return True
+
+    def build(self):
+        """
+        Read the whole json file once, to get the offset and submission month of each line.
+        """
+        offsets = list()
+        month_list = list()
+        position = 0
+        with open(self.filename, 'rb') as f:
+            for l in f:
+                if l.strip():
+                    offsets.append(position)
+                    date = decode_json_line(l.decode('utf-8'))['submission_date']
+                    month_list.append(month_key(date.year, date.month))
+                position += len(l)
+        offsets.append(position)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        month_list = np.array(month_list, dtype=np.int64)
+        # line numbers sorted by month, the lines of a month being in file order
+        self.month_order = np.argsort(month_list, kind='stable')
+        self.months, self.month_starts = np.unique(month_list[self.month_order], return_index=True)
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.index_filename))
+        fd, tmp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                np.savez(tmp_file, file_stamp=self.file_stamp, offsets=self.offsets, month_order=self.month_order,
+                         months=self.months, month_starts=self.month_starts)
+            os.replace(tmp_filename, self.index_filename)
+        except:
+            os.remove(tmp_filename)
+            raise
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get_line(self, i):
+        """
+        Returns
+        -------
+        string
+            the raw json line of the i-th job
+
+        """
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        # the end offset is the start of the next line: the line may contain trailing blank lines
+        return self._map[self.offsets[i]:self.offsets[i + 1]].decode('utf-8').strip()
+
+    def __getitem__(self, i):
+        """
+        Returns
+        -------
+        dict
+            the i-th job, decoded as in load_from_json but not sanitized (see sanitize_job)
+
+        """
+        return decode_job(self.get_line(i))
+
+    def get_month_lines(self, year, month):
+        """
+        Returns
+        -------
+        numpy.array
+            the line numbers of the jobs submitted during that month
+
+        """
+        pos = np.searchsorted(self.months, month_key(year, month))
+        if pos == len(self.months) or self.months[pos] != month_key(year, month):
+            return self.month_order[0:0]
+        end = self.month_starts[pos + 1] if pos + 1 < len(self.months) else len(self.month_order)
+        return self.month_order[self.month_starts[pos]:end]
+
+    def get_month(self, year, month):
+        """
+        Returns
+        -------
+        list
+            the jobs submitted during that month, decoded but not sanitized
+
+        """
+        return decode_jobs([self.get_line(i) for i in self.get_month_lines(year, month)])
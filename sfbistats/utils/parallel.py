@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+""" Parallel
+
+Load the json database with several processes.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import io
+import os
+import collections
+import multiprocessing
+
+from .city_index import CityIndex
+from .city_spellings import CitySpellings
+from .utils import decode_jobs, iter_line_batches, sanitize_job_fields, locate_jobs, get_city_replacements
+
+
+def find_chunks(filename, chunk_count):
+    """
+    Split a file in byte ranges of roughly equal size, each range starting and ending on a line boundary.
+
+    Parameters
+    ----------
+    filename : string
+    chunk_count : int
+
+    Returns
+    -------
+    list
+        [(start, end), ...] byte offsets, end excluded
+
+    """
+    size = os.path.getsize(filename)
+    chunk_size = max(1, size // max(1, chunk_count))
+    bounds = [0]
+    with open(filename, 'rb') as f:
+        while bounds[-1] < size:
+            f.seek(min(bounds[-1] + chunk_size, size) - 1)
+            # go to the start of the next line
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _load_chunk(args):
+    """
+    Sanitize the jobs of one byte range of the file. The cities are not located: the workers don't share
+    the rate limit of the geocoder, so the unknown cities are resolved by the parent process.
+
+    Returns
+    -------
+    list
+        the jobs, not spell corrected, without department and region
+    dict
+        {city: count}
+
+    """
+    filename, start, end = args
+    job_list = list()
+    city_dict = collections.defaultdict(int)
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # split the lines as iterating over the file does: str.splitlines would also split on the U+0085, U+2028
+    # and U+2029 characters that json strings may contain
+    for lines in iter_line_batches(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')):
+        for job in decode_jobs(lines):
+            job = sanitize_job_fields(job)
+            city_dict[job['city']] += 1
+            job_list.append(job)
+    return job_list, city_dict
+
+
+def load_from_json_parallel(filename, processes=None, city_index=None):
+    """
+    Same as load_from_json, but the file is split in chunks that are sanitized by a pool of processes.
+    The city counts of all chunks are merged. The unknown cities are then located once, concurrently, by this
+    process (see locate_jobs), and spell correction is done once on the merged counts, so the result is the
+    same as load_from_json's.
+
+    Parameters
+    ----------
+    filename : string
+        Path of the json file of the serialized job list.
+    processes : int
+        Number of worker processes. Defaults to the number of CPUs.
+    city_index : CityIndex
+        The city reference used to find departments and regions. Defaults to the shared
+        index of the package's city_locations.csv.
+
+    Returns
+    -------
+    list
+
+    """
+    if city_index is None:
+        city_index = CityIndex.shared()
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    # more chunks than processes, to balance the load
+    chunks = find_chunks(filename, processes * 4)
+
+    job_list = list()
+    city_dict = collections.defaultdict(int)
+    pool = multiprocessing.Pool(processes)
+    try:
+        # imap keeps the order of the chunks, and thus of the jobs
+        for chunk_job_list, chunk_city_dict in pool.imap(_load_chunk, [(filename, start, end)
+                                                                        for start, end in chunks]):
+            job_list.extend(chunk_job_list)
+            for city, count in chunk_city_dict.items():
+                city_dict[city] += count
+    finally:
+        pool.close()
+        pool.join()
+    locate_jobs(job_list, city_dict, city_index)
+
+    replace_dict = get_city_replacements(city_dict, spellings=CitySpellings.shared(city_index.city_filename))
+    for job in job_list:
+        if job['city'] in replace_dict:
+            job['city'] = replace_dict[job['city']]
+    return job_list
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+""" Sanitizer
+
+The rules used to clean the city names and durations, with their regular expressions compiled once,
+and their results remembered for each distinct raw value.
+
+"""
+from __future__ import print_function, unicode_literals, division
+import re
+import functools
+
+from .aliases import AliasMatcher
+
+
+class Sanitizer(object):
+    """
+    Same rules as sanitize_city_name, sanitize_city_name_for_geoloc and sanitize_duration, which use
+    a default instance of this class.
+
+    Raw values repeat a lot (Paris, 12 mois...), so the results are kept in a LRU cache of maxsize
+    entries per rule. stats() tells how often the caches are used.
+
+    The aliases used by city_name_for_geoloc come from alias_filename, city_aliases.csv by default
+    (see the aliases module).
+    """
+
+    def __init__(self, maxsize=4096, alias_filename=None):
+        self.city_name_regex = re.compile(r'\d*\s*(\w+[^,\(\)\d]+)[,\(\)\d]?', re.UNICODE)
+        self.spaces_regex = re.compile(r'\s+')
+        self.alias_matcher = AliasMatcher.from_file(alias_filename)
+        self.paris_regex = re.compile(r'(\s?Paris\s?)+')
+        self.months_regex = re.compile(r'(\d+).*(mois|month|months).*')
+        self.years_regex = re.compile(r'(\d+).*(année|années|an|ans|year|years).*')
+        self.weeks_regex = re.compile(r'(\d+).*(semaine|semaines|week|weeks).*')
+        self.number_regex = re.compile(r'(\d+)')
+        self.permanent_regex = re.compile(r'(indéterminé|indeterminé|indetermine|cdi|inderterminé|full time)')
+
+        self.city_name = functools.lru_cache(maxsize=maxsize)(self._city_name)
+        self.city_name_for_geoloc = functools.lru_cache(maxsize=maxsize)(self._city_name_for_geoloc)
+        self.duration = functools.lru_cache(maxsize=maxsize)(self._duration)
+
+    def _city_name(self, orig_name):
+        m = self.city_name_regex.match(orig_name)
+        if not m:
+            name = orig_name
+        else:
+            name = m.group(1).strip().replace('-', ' ').title()
+        # remove multiple spaces
+        return self.spaces_regex.sub(' ', name)
+
+    def _city_name_for_geoloc(self, orig_name):
+        name = self.alias_matcher.replace(orig_name)
+        name = self.paris_regex.sub('Paris', name)
+        # When several cities, just keep the first one
+        name = name.replace('/', '|').split('|')[0]
+        return name.strip()
+
+    def _duration(self, job_duration_string):
+        lower_string = job_duration_string.lower()
+        m = self.months_regex.search(job_duration_string)
+        if m:
+            return int(m.group(1))
+        m = self.years_regex.search(job_duration_string)
+        if m:
+            return int(m.group(1)) * 12
+        m = self.weeks_regex.search(job_duration_string)
+        if m:
+            return int(m.group(1)) / 4
+        m = self.number_regex.search(lower_string)
+        if m:
+            return int(m.group(1))
+        if self.permanent_regex.search(lower_string):
+            return 0
+        return -1
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            {rule name: {'hits': int, 'misses': int, 'hit_rate': float, 'size': int}}
+
+        """
+        stats = dict()
+        for name in ('city_name', 'city_name_for_geoloc', 'duration'):
+            info = getattr(self, name).cache_info()
+            total = info.hits + info.misses
+            stats[name] = {'hits': info.hits,
+                           'misses': info.misses,
+                           'hit_rate': info.hits / total if total else 0.,
+                           'size': info.currsize}
+        return stats
+
+    def clear(self):
+        for name in ('city_name', 'city_name_for_geoloc', 'duration'):
+            getattr(self, name).cache_clear()
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+""" Spelling
+
+Find the spelling variants of the city names (Montpelier for Montpellier...), used by spell_correct.
+
+Comparing every city with every other one costs a quadratic number of levenshtein distances. Instead, the
+cities are put in a SpellingIndex, which only returns the few cities that can be within a given distance
+of a name. The levenshtein distance is then computed for those cities only.
+
+"""
+from __future__ import print_function, unicode_literals, division
+
+# is_close_spelling never accepts a distance above this one
+MAX_CLOSE_DISTANCE = 3
+
+
+def get_char_masks(pattern):
+    """
+    Returns
+    -------
+    dict
+        {character: int whose bit i is set when pattern[i] is the character}
+
+    """
+    masks = dict()
+    for i, c in enumerate(pattern):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    return masks
+
+
+def _myers_distance(masks, pattern_length, text, max_dist=None):
+    """
+    Myers' bit-parallel algorithm, in Hyyro's formulation: a column of the dynamic programming matrix of
+    the pattern against the text is stored as the bits of two ints, the positive and negative vertical deltas.
+    Each character of the text is processed with a dozen operations on these ints.
+    """
+    if pattern_length == 0:
+        distance = len(text)
+        return distance if max_dist is None or distance <= max_dist else max_dist + 1
+    all_bits = (1 << pattern_length) - 1
+    last_bit = 1 << (pattern_length - 1)
+    positive = all_bits
+    negative = 0
+    # distance between the whole pattern and the text read so far
+    distance = pattern_length
+    remaining = len(text)
+    for c in text:
+        remaining -= 1
+        x = masks.get(c, 0) | negative
+        diagonal = (((x & positive) + positive) ^ positive) | x
+        horizontal_positive = negative | ~(diagonal | positive)
+        horizontal_negative = diagonal & positive
+        if horizontal_positive & last_bit:
+            distance += 1
+        elif horizontal_negative & last_bit:
+            distance -= 1
+        # each remaining character lowers the distance by 1 at best
+        if max_dist is not None and distance - remaining > max_dist:
+            return max_dist + 1
+        x = (horizontal_positive << 1) | 1
+        negative = x & diagonal & all_bits
+        positive = ((horizontal_negative << 1) | ~(diagonal | x)) & all_bits
+    return distance
+
+
+def levenshtein(source, target, max_dist=None):
+    """
+    Levenshtein distance, computed with Myers' bit-parallel algorithm.
+
+    Parameters
+    ----------
+    source : string
+    target : string
+    max_dist : int
+        If given, the computation stops as soon as the distance is known to be above max_dist,
+        and max_dist + 1 is returned.
+
+    Returns
+    -------
+    int
+
+    """
+    if len(source) > len(target):
+        source, target = target, source
+    if max_dist is not None and len(target) - len(source) > max_dist:
+        return max_dist + 1
+    # the common prefix and suffix don't change the distance
+    prefix = 0
+    while prefix < len(source) and source[prefix] == target[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < len(source) - prefix and source[-1 - suffix] == target[-1 - suffix]:
+        suffix += 1
+    source = source[prefix:len(source) - suffix]
+    target = target[prefix:len(target) - suffix]
+    return _myers_distance(get_char_masks(source), len(source), target, max_dist)
+
+
+def levenshtein_many(source, targets, max_dist=None):
+    """
+    Same as levenshtein(source, target, max_dist) for each target, the bit masks of source being computed once.
+
+    Returns
+    -------
+    list
+        the distance to each target
+
+    """
+    masks = get_char_masks(source)
+    distances = list()
+    for target in targets:
+        if max_dist is not None and abs(len(target) - len(source)) > max_dist:
+            distances.append(max_dist + 1)
+        else:
+            distances.append(_myers_distance(masks, len(source), target, max_dist))
+    return distances
+
+
+def is_close_spelling(city, dl):
+    """
+    Tells if a spelling at levenshtein distance dl from city is close enough to be a variant of city.
+    """
+    return (len(city) < 10 and dl == 1) or (len(city) > 10 and dl < 4 and dl != 0)
+
+
+def get_close_spelling(city, city_dict):
+    leven_list = list()
+    for city_check in city_dict.keys():
+        dl = levenshtein(city, city_check, MAX_CLOSE_DISTANCE)
+        if is_close_spelling(city, dl):
+            leven_list.append(city_check)
+    return leven_list
+
+
+def get_segments(length, segment_count):
+    """
+    Split a string of the given length in segment_count contiguous segments, of nearly equal lengths.
+
+    Returns
+    -------
+    list
+        (start, length) of each segment
+
+    """
+    segments = list()
+    short_count = segment_count - length % segment_count
+    start = 0
+    for i in range(segment_count):
+        segment_length = length // segment_count + (0 if i < short_count else 1)
+        segments.append((start, segment_length))
+        start += segment_length
+    return segments
+
+
+class SpellingIndex(object):
+    """
+    Index of words, returning the words within a small levenshtein distance of a query.
+
+    Each word is split in max_dist + 1 segments, stored in a dict keyed by the length of the word, the rank
+    of the segment and the segment itself. Each edit changes at most one segment, and shifts the following ones
+    by at most one character. So a word within k edits of the query has at least max_dist + 1 - k segments
+    appearing unchanged in the query, at most k characters away from their position in the word.
+    Only the words with enough such segments are compared to the query.
+    """
+
+    def __init__(self, words=(), max_dist=MAX_CLOSE_DISTANCE):
+        """
+        Parameters
+        ----------
+        words : iterable
+        max_dist : int
+            the largest distance that search will accept
+        """
+        self.max_dist = max_dist
+        self.segment_count = max_dist + 1
+        self.segments = dict()
+        self.words = set()
+        # the segments of each length of word
+        self._segment_positions = dict()
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def get_segments(self, length):
+        if length not in self._segment_positions:
+            self._segment_positions[length] = get_segments(length, self.segment_count)
+        return self._segment_positions[length]
+
+    def add(self, word):
+        if word in self.words:
+            return
+        self.words.add(word)
+        length = len(word)
+        for i, (start, segment_length) in enumerate(self.get_segments(length)):
+            key = (length, i, word[start:start + segment_length])
+            self.segments.setdefault(key, list()).append(word)
+
+    def candidates(self, word, max_dist, min_length=0):
+        """
+        Parameters
+        ----------
+        word : string
+        max_dist : int
+        min_length : int
+            only look for words at least this long
+
+        Returns
+        -------
+        list
+            the words that can be within max_dist of word. The others are surely not.
+
+        """
+        if max_dist > self.max_dist:
+            raise ValueError('This index only finds words within {} edits'.format(self.max_dist))
+        min_segments = self.segment_count - max_dist
+        length = len(word)
+        # number of segments of each word found in the query
+        found = dict()
+        for other_length in range(max(min_length, length - max_dist), length + max_dist + 1):
+            # a segment shifted by shift characters costs at least abs(shift) edits before it, and enough
+            # edits after it to make up for the rest of the difference of length
+            shifts = [shift for shift in range(-max_dist, max_dist + 1)
+                      if abs(shift) + abs(length - other_length - shift) <= max_dist]
+            for i, (start, segment_length) in enumerate(self.get_segments(other_length)):
+                matched = set()
+                for shift in shifts:
+                    pos = start + shift
+                    if 0 <= pos <= length - segment_length:
+                        matched.update(self.segments.get((other_length, i, word[pos:pos + segment_length]), ()))
+                if min_segments == 1:
+                    found.update(dict.fromkeys(matched, 1))
+                    continue
+                for other in matched:
+                    found[other] = found.get(other, 0) + 1
+        return [other for other, count in found.items() if count >= min_segments]
+
+    def search(self, word, max_dist, min_length=0):
+        """
+        Parameters
+        ----------
+        word : string
+        max_dist : int
+        min_length : int
+            only look for words at least this long
+
+        Returns
+        -------
+        list
+            (word, distance) couples of the words within max_dist of word, word itself included if present
+
+        """
+        candidates = self.candidates(word, max_dist, min_length)
+        distances = levenshtein_many(word, candidates, max_dist)
+        return [(other, d) for other, d in zip(candidates, distances) if d <= max_dist]
+
+
+def get_close_spellings(city_dict):
+    """
+    Same as get_close_spelling for all the cities of city_dict, using a SpellingIndex.
+
+    The cities are added to the index from the shortest to the longest, each one being searched among the
+    cities already there, so that each couple of close cities is found only once.
+
+    Parameters
+    ----------
+    city_dict : dict
+        {city: count}
+
+    Returns
+    -------
+    dict
+        {city: list of its close spellings, in the order of city_dict}
+
+    """
+    index = SpellingIndex()
+    close_spellings = dict((city, list()) for city in city_dict)
+    for city in sorted(city_dict, key=len):
+        # the shorter cities accept a variant at distance 1 only, and so do the cities they are compared to
+        max_dist = MAX_CLOSE_DISTANCE if len(city) > 10 else 1
+        for other, d in index.search(city, max_dist):
+            if is_close_spelling(city, d):
+                close_spellings[city].append(other)
+            if is_close_spelling(other, d):
+                close_spellings[other].append(city)
+        index.add(city)
+    positions = dict((city, i) for i, city in enumerate(city_dict))
+    for city in close_spellings:
+        close_spellings[city].sort(key=positions.get)
+    return close_spellings
@@ -5,18 +5,29 @@ Miscellaneous stuff.
 
 """
 from __future__ import print_function, unicode_literals, division
-import re
 import geopy
-import numpy as np
-import csv
-import pkg_resources
 import collections
-import json
-from bson import json_util
 
 from ..job_offer import JobOfferAnon
+from .city_index import CityIndex
+from .city_spellings import CitySpellings
+from .decoder import decode_json_line
+from .geocoder import resolve_cities
+from .sanitizer import Sanitizer
+from .spelling import levenshtein, is_close_spelling, get_close_spelling, get_close_spellings
 
-def load_from_json(file):
+# increment when a change in the sanitizing functions changes their output, to invalidate cached datasets
+# 2: the city aliases are applied in one pass (see aliases.py): the longest alias wins, and no alias is matched in
+# the replacement of another one
+SANITIZER_VERSION = 2
+
+# used by sanitize_city_name, sanitize_city_name_for_geoloc and sanitize_duration
+default_sanitizer = Sanitizer()
+
+# number of lines decoded together by decode_jobs
+BATCH_SIZE = 1024
+
+def load_from_json(file, city_index=None):
     """
     This function load a json database into a list of dict.
 
@@ -24,28 +35,240 @@ def load_from_json(file):
     ----------
     file : file handler
         An already opened json file handler to the serialized job list.
+    city_index : CityIndex
+        The city reference used to find departments and regions. Defaults to the shared
+        index of the package's city_locations.csv.
+
+    Returns
+    -------
+    list
+
+    """
+    return list(iter_jobs(file, city_index=city_index))
+
+
+def iter_jobs(file, city_index=None, spell_check=True):
+    """
+    Generator yielding the sanitized jobs of a json database one at a time, as dict.
+
+    When spell_check is True, a first pass over the file only counts the city names to decide which
+    spellings must be corrected, then the file is rewound and the jobs are yielded already corrected.
+    Only the city histogram is kept in memory, never the whole job list.
+    The cities of the histogram that are missing from city_index are located all at once, concurrently,
+    between the two passes (see resolve_unknown_cities).
+
+    Parameters
+    ----------
+    file : file handler
+        An already opened json file handler to the serialized job list. Must be seekable if spell_check is True.
+    city_index : CityIndex
+        The city reference used to find departments and regions. Defaults to the shared
+        index of the package's city_locations.csv.
+    spell_check : bool
+        Correct the city names with spell_correct's rules.
+
+    Returns
+    -------
+    generator
+
+    """
+    if city_index is None:
+        city_index = CityIndex.shared()
+    replace_dict = dict()
+    if spell_check:
+        start = file.tell()
+        city_dict = count_cities(file)
+        try:
+            resolve_unknown_cities(city_dict, city_index)
+        finally:
+            city_index.flush()
+        replace_dict = get_city_replacements(city_dict, spellings=CitySpellings.shared(city_index.city_filename))
+        file.seek(start)
+    try:
+        for lines in iter_line_batches(file):
+            for job in decode_jobs(lines):
+                job = sanitize_job(job, city_index)
+                if job['city'] in replace_dict:
+                    job['city'] = replace_dict[job['city']]
+                yield job
+    finally:
+        # new cities found by the geocoder are saved all at once
+        city_index.flush()
+
+
+def decode_job(line):
+    """
+    Decode one line of the json database into a dict with JobOfferAnon's fields.
+
+    Parameters
+    ----------
+    line : string
+
+    Returns
+    -------
+    dict
+
+    """
+    # use dict instead of directly object, better with pandas
+    return JobOfferAnon.from_json(decode_json_line(line)).to_dict()
+
+
+def decode_jobs(lines):
+    """
+    Same as decode_job for many lines at once, with JobOfferAnon.dicts_from_json: no JobOfferAnon is built.
+
+    Parameters
+    ----------
+    lines : list
+        non empty lines of the json database
 
     Returns
     -------
     list
+        the jobs, as dict
+
+    """
+    return JobOfferAnon.dicts_from_json([decode_json_line(l) for l in lines])
+
+
+def iter_line_batches(file, batch_size=BATCH_SIZE):
+    """
+    Generator yielding the non empty lines of a file, by lists of at most batch_size lines.
+    """
+    lines = list()
+    for l in file:
+        if not l.strip():
+            continue
+        lines.append(l)
+        if len(lines) == batch_size:
+            yield lines
+            lines = list()
+    if lines:
+        yield lines
+
+
+def sanitize_job(job, city_index):
+    """
+    Sanitize the city and duration of a decoded job, and add its department and region.
+    The job is modified in place.
+
+    Parameters
+    ----------
+    job : dict
+    city_index : CityIndex
+
+    Returns
+    -------
+    dict
+
+    """
+    sanitize_job_fields(job)
+    dep, reg = city_to_dep_region(job['city'], city_index=city_index)
+    job['department'] = dep
+    job['region'] = reg
+    return job
+
+
+def sanitize_job_fields(job):
+    """
+    Sanitize the city and duration of a decoded job, without locating its city (see locate_jobs).
+    The job is modified in place.
+
+    Parameters
+    ----------
+    job : dict
+
+    Returns
+    -------
+    dict
+
+    """
+    job['city'] = sanitize_city_name(job['city'])
+    job['city'] = sanitize_city_name_for_geoloc(job['city'])
+    job['duration'] = sanitize_duration(job['duration'])
+    return job
+
+
+def locate_jobs(job_list, cities, city_index):
+    """
+    Add the department and region of jobs sanitized by sanitize_job_fields. The cities missing from city_index
+    are first located all at once, concurrently (see resolve_unknown_cities), then each job is finished with a
+    lookup. The jobs are modified in place.
+
+    Parameters
+    ----------
+    job_list : list
+    cities : iterable
+        the distinct cities of job_list, typically the keys of their histogram
+    city_index : CityIndex
+
+    """
+    try:
+        resolve_unknown_cities(cities, city_index)
+    finally:
+        # new cities found by the geocoder are saved all at once
+        city_index.flush()
+    for job in job_list:
+        job['department'], job['region'] = city_index[job['city']]
+
+
+def resolve_unknown_cities(names, city_index, max_workers=None, retries=3, backoff=1.0):
+    """
+    Locate the cities missing from city_index concurrently, with the geocoder of city_index, and add them to it.
+    If some cities can't be located, the error of the first one is raised once the others have been added.
+
+    Parameters
+    ----------
+    names : iterable
+        sanitized city names
+    city_index : CityIndex
+    max_workers : int
+        number of threads querying the geocoder, defaults to city_index.geocoder_workers
+    retries : int
+    backoff : float
+        see geocoder.locate_with_retry
+
+    """
+    unknown = [name for name in names if name not in city_index]
+    if not unknown:
+        return
+    if max_workers is None:
+        max_workers = city_index.geocoder_workers
+    print('Unknown cities:', ', '.join(unknown))
+    resolutions, failures = resolve_cities(unknown, city_index.geocoder, max_workers=max_workers, retries=retries,
+                                           backoff=backoff)
+    for name in unknown:
+        if name in resolutions:
+            city_index.add(name, *resolutions[name])
+    for name in unknown:
+        if name in failures:
+            raise failures[name]
+
+
+def count_cities(file):
+    """
+    Count the occurrences of each sanitized city name in a json database.
+
+    Parameters
+    ----------
+    file : file handler
+
+    Returns
+    -------
+    dict
+        {city: count}, cities in order of first appearance
 
     """
-    job_list = list()
     city_dict = collections.defaultdict(int)
-    for l in file.readlines():
-        # use dict instead of directly object, better with pandas
-        job = JobOfferAnon.from_json(json.loads(l, object_hook=json_util.object_hook)).to_dict()
-        job['city'] = sanitize_city_name(job['city'])
-        job['city'] = sanitize_city_name_for_geoloc(job['city'])
-        city_file = pkg_resources.resource_filename('sfbistats.utils', 'city_locations.csv')
-        dep, reg = city_to_dep_region(job['city'], city_file)
-        job['department'] = dep
-        job['region'] = reg
-        job['duration'] = sanitize_duration(job['duration'])
-        city_dict[job['city']] += 1
-        job_list.append(job)
-    job_list = spell_correct(job_list, city_dict)
-    return job_list
+    for l in file:
+        if not l.strip():
+            continue
+        # only the city is needed, no job is built
+        city = decode_json_line(l)['city']
+        city = sanitize_city_name_for_geoloc(sanitize_city_name(city))
+        city_dict[city] += 1
+    return city_dict
+
 
 def sanitize_city_name(orig_name):
     """
@@ -76,14 +299,7 @@ def sanitize_city_name(orig_name):
     string
 
     """
-    m = re.match('\d*\s*(\w+[^,\(\)\d]+)[,\(\)\d]?', orig_name, re.UNICODE)
-    if not m:
-        name = orig_name
-    else:
-        name =  m.group(1).strip().replace('-', ' ').title()
-    # remove multiple spaces
-    name = re.sub('\s+', ' ', name)
-    return name
+    return default_sanitizer.city_name(orig_name)
 
 def sanitize_city_name_for_geoloc(orig_name):
     """
@@ -98,40 +314,7 @@ def sanitize_city_name_for_geoloc(orig_name):
     string
 
     """
-    orig_name = orig_name
-    # A dictionary of substitutions
-    replace_dict = {'ou': '|', 'or': '|', 'et': '|', 'and': '|', 'puis': '|',
-                    '/mer': ' Sur Mer',
-                    'cedex': '',
-                    'plateau de saclay': 'Saclay',
-                    'ile de france': 'Paris',
-                    'france': 'Paris',
-                    'montpelllier': 'Montpellier',
-                    'cambridege': 'Cambridge',
-                    'evry orsay': 'Evry',
-                    'lyon evry': 'Lyon',
-                    'marseille nice': 'Marseille',
-                    'lyon villeurbanne': 'Lyon',
-                    'clermont fd': 'Clermont Ferrand',
-                    'hinxton cambridge': 'Hinxton',
-                    'hinxton cambridge uk': 'Hinxton',
-                    'bordeaux cestas': 'Bordeaux',
-                    'montpellier perpignan': 'Montpellier',
-                    'nice sophia antipolis': 'Nice'}
-    pattern = r'\b({})\b'.format('|'.join(sorted(re.escape(k) for k in replace_dict)))
-    name = re.sub(pattern, lambda m: replace_dict.get(m.group(0).lower()), orig_name, flags=re.IGNORECASE)
-    # not in the regex because of accents
-    name = name.replace(u'Université Paris Saclay', 'Saclay')
-    name = name.replace(u"Génopôle D'Evry", 'Evry')
-    name = name.replace(u'Île De', 'Paris')
-    name = name.replace(u' Paris Région Parisienne', 'Paris')
-    name = name.replace(u'Région Parisienne', 'Paris')
-    name = re.sub('(\s?Paris\s?)+', 'Paris', name)
-    # When several cities, just keep the first one
-    name = name.replace('/', '|').split('|')[0]
-    name = name.strip()
-
-    return name
+    return default_sanitizer.city_name_for_geoloc(orig_name)
 
 
 def sanitize_duration(job_duration_string):
@@ -143,26 +326,7 @@ def sanitize_duration(job_duration_string):
     return -1 if can't parse correctly
     return 0 if not applicable (ex: CDI)
     """
-    m1 = re.search('(\d+).*(mois|month|months).*', job_duration_string)
-    m2 = re.search('(\d+).*(année|années|an|ans|year|years).*', job_duration_string)
-    m3 = re.search('(\d+).*(semaine|semaines|week|weeks).*', job_duration_string)
-    m4 = re.search('(\d+)', job_duration_string.lower())
-
-    m5 = re.search('(indéterminé|indeterminé|indetermine|cdi|inderterminé|full time)', job_duration_string.lower())
-
-    if m1:
-        dur = int(m1.group(1))
-    elif m2:
-        dur = int(m2.group(1)) * 12
-    elif m3:
-        dur = int(m3.group(1)) / 4
-    elif m4:
-        dur = int(m4.group(1))
-    elif m5:
-        dur = 0
-    else:
-        dur = -1
-    return dur
+    return default_sanitizer.duration(job_duration_string)
 
 
 def get_colors():
@@ -182,9 +346,9 @@ def get_colors():
           'plum', 'peru', 'saddlebrown', 'mediumorchid', 'goldenrod', 'darksage', 'coral', 'lightseagreen']
 
 
-def query_GoogleV3(name):
+def query_GoogleV3(name, domain='maps.google.fr', scheme=None, api_key=None, timeout=5):
     print('Querying for location:', name)
-    service = geopy.GoogleV3(domain='maps.google.fr', timeout=5)
+    service = geopy.GoogleV3(api_key=api_key, domain=domain, scheme=scheme, timeout=timeout)
     loc = service.geocode(name, exactly_one=True)
     if loc is None:  # extreme case, google doesn't return anything
         # try to split and query separate terms
@@ -217,150 +381,135 @@ def query_GoogleV3(name):
     return d
 
 
-def city_to_dep_region(name, city_filename):
+def city_to_dep_region(name, city_filename=None, city_index=None, geocoder=None):
     """ Returns the department and region from the city name, if located in France.
-    Otherwise, returns 'Étranger'. """
-
-    city_dict = {}
-    with open(city_filename, 'r', encoding='utf-8') as city_file:
-        for l in csv.reader(city_file):
-            #l = l.decode('utf-8')
-            #l = map(lambda x: x.decode('utf8'), l)
-            city, dep, reg = l
-            city_dict[city] = (dep, reg)
-
-    if name in city_dict:
-        return city_dict[name]
+    Otherwise, returns 'Étranger'.
+
+    Cities are looked up in city_index (by default the shared index of city_filename). Unknown cities are
+    geocoded and added to the index. If no city_index is given, the new city is written to the csv file
+    right away, otherwise it is up to the caller to flush() the index.
+
+    The geocoder used is, in order of preference: the geocoder parameter, the geocoder of city_index,
+    the GoogleV3 API. See the geocoder module.
+    """
+    flush = False
+    if city_index is None:
+        city_index = CityIndex.shared(city_filename)
+        flush = True
+    if geocoder is None:
+        geocoder = city_index.geocoder
+
+    if name in city_index:
+        return city_index[name]
     else:
         print('Unknown city:', name)
-        loc_dic = query_GoogleV3(name)
-
-        # check if everything is alright
-        if not loc_dic['country'] or loc_dic['country'] != 'France':
-            country = u'Étranger'
+        if geocoder is None:
+            dep, reg = resolve_dep_region(name)
         else:
-            country = loc_dic['country']
-            if loc_dic['admin_lvl1']:
-                reg = loc_dic['admin_lvl1']
-            else:
-                if loc_dic['colloquial']:
-                    reg = loc_dic['colloquial']
-                else:  # Cadarache case, search again
-                    loc_dic2 = query_GoogleV3(loc_dic['locality'])
-                    if loc_dic2['admin_lvl1']:
-                        reg = loc_dic2['admin_lvl1']
-                    else:
-                        if loc_dic2['colloquial']:
-                            reg = loc_dic2['colloquial']
-                        else:
-                            raise NameError(name, 'Could not find region')
-            if loc_dic['admin_lvl2']:
-                dep = loc_dic['admin_lvl2']
-            else: # search again
-                loc_dic2 = query_GoogleV3(loc_dic['locality'])
-                if loc_dic2['admin_lvl2']:
-                    reg = loc_dic2['admin_lvl2']
-                else:
-                    raise NameError(name, 'Could not find region')
-
-
-        print ('Found:', ', '.join([dep, reg, country]))
-
-        # Conversion to new regions
-        conv_table = [(('haute normandie','basse normandie'), 'Normandie'),
-                      (('champagne ardenne','alsace','lorraine', 'alsace champagne ardenne lorraine', 'grand est'), 'Grand-Est'),
-                      (('bourgogne',u'franche comté', u'bourgogne franche comté'),u'Bourgogne-Franche-Comté'),
-                      (('auvergne',u'rhône alpes', u'auvergne rhône alpes'),u'Auvergne-Rhône-Alpes'),
-                      (('aquitaine','limousin','poitou charentes', 'aquitaine limousin poitou charentes', 'nouvelle aquitaine'), 'Nouvelle-Aquitaine'),
-                      (('languedoc roussillon',u'midi pyrénées', u'languedoc roussillon midi pyrénées'), 'Occitanie'),
-                      (('nord pas de calais','picardie','nord pas de calais picardie', 'hauts de france'), 'Hauts-de-France'),
-                      (('pays de la loire'), 'Pays-de-la-Loire'),
-                      (('centre'), 'Centre-Val-de-Loire'),
-                      ((u'provence alpes côte d\'azur'), u'Provence-Alpes-Côte-d\'Azur'),
-                      ((u'île de france', 'ile de france'), u'Île-de-France')]
-        newregions_dict = {}
-        for keylist in conv_table:
-            newregions_dict.update(dict.fromkeys(keylist[0], keylist[1]))
-        normalize_reg = reg.lower().replace('-', ' ')
-        old_reg = reg
-        if normalize_reg in newregions_dict:
-            reg = newregions_dict[normalize_reg]
-        print(old_reg+"     "+normalize_reg+"      "+reg)
-
-        if country != 'France':
-            dep = u'Étranger'
-            reg = u'Étranger'
-        line_list = [name, dep, reg]
-        new_line = u','.join(line_list)
-        with open(city_filename, 'a', encoding='utf-8') as city_file:
-            print (new_line, file=city_file)
+            dep, reg = geocoder.locate(name)
+        city_index.add(name, dep, reg)
+        if flush:
+            city_index.flush()
         return dep, reg
 
 
-def levenshtein(source, target):
+def resolve_dep_region(name, query=query_GoogleV3):
+    """ Locate a city with a geocoder's query function, and returns its department and region, or 'Étranger'
+    for both if the city is not in France.
+    Raises NameError when the city can't be located precisely enough.
     """
-    see https://en.wikibooks.org/wiki/Algorithm_Implementation/Strings/Levenshtein_distance#Python
-    5th example
+    loc_dic = query(name)
+
+    # check if everything is alright
+    if not loc_dic['country'] or loc_dic['country'] != 'France':
+        country = u'Étranger'
+        dep = u'Étranger'
+        reg = u'Étranger'
+    else:
+        country = loc_dic['country']
+        if loc_dic['admin_lvl1']:
+            reg = loc_dic['admin_lvl1']
+        else:
+            if loc_dic['colloquial']:
+                reg = loc_dic['colloquial']
+            else:  # Cadarache case, search again
+                loc_dic2 = query(loc_dic['locality'])
+                if loc_dic2['admin_lvl1']:
+                    reg = loc_dic2['admin_lvl1']
+                else:
+                    if loc_dic2['colloquial']:
+                        reg = loc_dic2['colloquial']
+                    else:
+                        raise NameError(name, 'Could not find region')
+        if loc_dic['admin_lvl2']:
+            dep = loc_dic['admin_lvl2']
+        else: # search again
+            loc_dic2 = query(loc_dic['locality'])
+            if loc_dic2['admin_lvl2']:
+                dep = loc_dic2['admin_lvl2']
+            else:
+                raise NameError(name, 'Could not find department')
+
+
+    print ('Found:', ', '.join([dep, reg, country]))
+
+    # Conversion to new regions
+    conv_table = [(('haute normandie','basse normandie'), 'Normandie'),
+                  (('champagne ardenne','alsace','lorraine', 'alsace champagne ardenne lorraine', 'grand est'), 'Grand-Est'),
+                  (('bourgogne',u'franche comté', u'bourgogne franche comté'),u'Bourgogne-Franche-Comté'),
+                  (('auvergne',u'rhône alpes', u'auvergne rhône alpes'),u'Auvergne-Rhône-Alpes'),
+                  (('aquitaine','limousin','poitou charentes', 'aquitaine limousin poitou charentes', 'nouvelle aquitaine'), 'Nouvelle-Aquitaine'),
+                  (('languedoc roussillon',u'midi pyrénées', u'languedoc roussillon midi pyrénées'), 'Occitanie'),
+                  (('nord pas de calais','picardie','nord pas de calais picardie', 'hauts de france'), 'Hauts-de-France'),
+                  (('pays de la loire'), 'Pays-de-la-Loire'),
+                  (('centre'), 'Centre-Val-de-Loire'),
+                  ((u'provence alpes côte d\'azur'), u'Provence-Alpes-Côte-d\'Azur'),
+                  ((u'île de france', 'ile de france'), u'Île-de-France')]
+    newregions_dict = {}
+    for keylist in conv_table:
+        newregions_dict.update(dict.fromkeys(keylist[0], keylist[1]))
+    normalize_reg = reg.lower().replace('-', ' ')
+    old_reg = reg
+    if normalize_reg in newregions_dict:
+        reg = newregions_dict[normalize_reg]
+    print(old_reg+"     "+normalize_reg+"      "+reg)
+
+    if country != 'France':
+        dep = u'Étranger'
+        reg = u'Étranger'
+    return dep, reg
+
+
+def get_city_replacements(city_dict, close_spellings=None, spellings=None):
+    """
+    Decide which city spellings should be replaced by a close one.
+    When two spellings are close, the less frequent one is replaced by the most frequent one.
 
     Parameters
     ----------
-    source
-    target
+    city_dict : dict
+        {city: count}
+    close_spellings : dict
+        {city: get_close_spelling(city, city_dict)}, if already known. Otherwise they are found with
+        get_close_spellings.
+    spellings : CitySpellings
+        If given, the close spellings of the known cities are taken from it instead of being searched,
+        and the counts and replacements are saved in it.
 
     Returns
     -------
+    dict
+        {wrong spelling: correct spelling}
 
     """
-    if len(source) < len(target):
-        return levenshtein(target, source)
-
-    # So now we have len(source) >= len(target).
-    if len(target) == 0:
-        return len(source)
-
-    # We call tuple() to force strings to be used as sequences
-    # ('c', 'a', 't', 's') - numpy uses them as values by default.
-    source = np.array(tuple(source))
-    target = np.array(tuple(target))
-
-    # We use a dynamic programming algorithm, but with the
-    # added optimization that we only need the last two rows
-    # of the matrix.
-    previous_row = np.arange(target.size + 1)
-    for s in source:
-        # Insertion (target grows longer than source):
-        current_row = previous_row + 1
-
-        # Substitution or matching:
-        # Target and source items are aligned, and either
-        # are different (cost of 1), or are the same (cost of 0).
-        current_row[1:] = np.minimum(
-                current_row[1:],
-                np.add(previous_row[:-1], target != s))
-
-        # Deletion (target grows shorter than source):
-        current_row[1:] = np.minimum(
-                current_row[1:],
-                current_row[0:-1] + 1)
-
-        previous_row = current_row
-
-    return previous_row[-1]
-
-
-def get_close_spelling(city, city_dict):
-    leven_list = list()
-    for city_check in city_dict.keys():
-        dl = levenshtein(city, city_check)
-        if (len(city) < 10 and dl == 1) or (len(city) > 10 and dl < 4 and dl != 0):
-            leven_list.append(city_check)
-    return leven_list
-
-
-def spell_correct(job_list, city_dict):
+    if close_spellings is None:
+        if spellings is None:
+            close_spellings = get_close_spellings(city_dict)
+        else:
+            close_spellings = spellings.get_close_spellings(city_dict)
     replace_dict = dict()
     for city in city_dict.keys():
-        closests = get_close_spelling(city, city_dict)
+        closests = close_spellings[city]
         if len(closests) == 1:
             alt = closests[0]
             if alt in replace_dict.values():
@@ -371,8 +520,34 @@ def spell_correct(job_list, city_dict):
             else:
                 replace_dict[alt] = city
     #print(replace_dict)
+    if spellings is not None:
+        spellings.update(city_dict, replace_dict)
+        spellings.flush()
+    return replace_dict
+
+
+def spell_correct(job_list, city_dict, spellings=None):
+    """
+    Replace the city names of job_list according to get_city_replacements.
+
+    Parameters
+    ----------
+    job_list : list
+    city_dict : dict
+        {city: count}
+    spellings : CitySpellings
+        Where the close spellings are remembered between runs. Defaults to the spellings stored next to
+        the package's city_locations.csv.
+
+    Returns
+    -------
+    list
+
+    """
+    if spellings is None:
+        spellings = CitySpellings.shared()
+    replace_dict = get_city_replacements(city_dict, spellings=spellings)
     for job in job_list:
         if job['city'] in replace_dict:
             job['city'] = replace_dict[job['city']]
     return job_list
-